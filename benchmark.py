@@ -0,0 +1,182 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List
+
+from generator import EMOJIS
+
+# Metrics where a larger value is better; everything else should go down
+HIGHER_IS_BETTER = {"images_per_sec"}
+COMPARED_METRICS = ["images_per_sec", "p50_latency", "p95_latency", "p99_latency", "peak_rss_mb"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_cell(host: str, concurrency: int, batch_size: int) -> Dict:
+    """Runs in a fresh process so peak RSS belongs to this cell alone."""
+    os.environ.setdefault("STABILITY_API_KEY", "benchmark")
+    from generator import AlienCeramicsGenerator, FilterStats, LatencyEstimator
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Keep benchmark latencies and filter hits out of the persisted production models;
+        # no pacing, so the numbers measure dispatch rather than the courtesy pause
+        latency = LatencyEstimator(Path(output_dir) / "latency_model.json")
+        filter_stats = FilterStats(Path(output_dir) / "filter_stats.json")
+        generator = AlienCeramicsGenerator([], console_mode="quiet", host=host, latency=latency,
+                                           filter_stats=filter_stats, pacing=0)
+        start = time.perf_counter()
+        results = generator.generate_batch(
+            num_images=batch_size, output_dir=output_dir, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+
+    latencies = [r['generation_seconds'] for r in results]
+    return {
+        'images': len(results),
+        'elapsed': elapsed,
+        'images_per_sec': len(results) / elapsed if elapsed else 0.0,
+        'p50_latency': percentile(latencies, 0.50),
+        'p95_latency': percentile(latencies, 0.95),
+        'p99_latency': percentile(latencies, 0.99),
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+        (1024 * 1024 if sys.platform == "darwin" else 1024)
+    }
+
+
+def run_matrix(args) -> Dict:
+    from fake_stability_server import LatencyModel, serve
+
+    cells = []
+    matrix = itertools.product(args.latency, args.error_rate, args.concurrency, args.batch_size)
+    for latency, error_rate, concurrency, batch_size in matrix:
+        port = free_port()
+        server = serve(port=port, workers=max(16, concurrency * 2),
+                       latency=LatencyModel(latency, args.scale_by_pixels),
+                       unavailable_rate=error_rate)
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(run_cell, f"localhost:{port}",
+                                     concurrency, batch_size).result()
+        finally:
+            server.stop(grace=None)
+
+        cell = {
+            'latency': latency,
+            'error_rate': error_rate,
+            'concurrency': concurrency,
+            'batch_size': batch_size,
+            **result
+        }
+        cells.append(cell)
+        print(f"{EMOJIS['time']} {cell_key(cell)}: {cell['images_per_sec']:.2f} img/s, "
+              f"p50 {cell['p50_latency']:.2f}s, p95 {cell['p95_latency']:.2f}s, "
+              f"p99 {cell['p99_latency']:.2f}s, RSS {cell['peak_rss_mb']:.1f} MB")
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cells': cells
+    }
+
+
+def cell_key(cell: Dict) -> str:
+    return (f"latency={cell['latency']} errors={cell['error_rate']} "
+            f"concurrency={cell['concurrency']} batch={cell['batch_size']}")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    baseline_cells = {cell_key(cell): cell for cell in baseline['cells']}
+    regressions = []
+    for cell in current['cells']:
+        key = cell_key(cell)
+        reference = baseline_cells.get(key)
+        if reference is None:
+            print(f"{EMOJIS['warning']} No baseline for {key}")
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = reference[metric], cell[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            marker = EMOJIS['error'] if worse > threshold else EMOJIS['success']
+            print(f"{marker} {key} {metric}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+            if worse > threshold:
+                regressions.append(f"{key} {metric} {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Throughput-vs-concurrency benchmarks against fake_stability_server',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark matrix')
+    run_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    run_parser.add_argument('--batch-size', type=int, nargs='+', default=[16])
+    run_parser.add_argument('--latency', nargs='+', default=['fixed:0.5', 'lognormal:-0.7,0.5'],
+                            help='fake_stability_server latency profiles')
+    run_parser.add_argument('--scale-by-pixels', action='store_true',
+                            help='Scale server latency by image pixel count')
+    run_parser.add_argument('--error-rate', type=float, nargs='+', default=[0.0, 0.05],
+                            help='Fraction of requests failed with UNAVAILABLE')
+    run_parser.add_argument('-o', '--output', default='benchmarks/latest.json',
+                            help='Where to write the JSON results')
+
+    compare_parser = subparsers.add_parser('compare', help='Flag regressions against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Allowed relative change before flagging (0.10 = 10%%)')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run_matrix(args)
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"{EMOJIS['save']} Results written to: {output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\n{EMOJIS['error']} {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n{EMOJIS['success']} No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
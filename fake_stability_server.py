@@ -0,0 +1,280 @@
+import argparse
+import itertools
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent import futures
+from pathlib import Path
+from typing import Dict, List
+
+import grpc
+import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+import stability_sdk.interfaces.gooseai.generation.generation_pb2_grpc as generation_grpc
+
+from generator import EMOJIS
+
+
+def synthesize_png(width: int, height: int, seed: int) -> bytes:
+    """Build a valid RGB PNG with a seed-dependent gradient, no imaging deps needed."""
+    rng = random.Random(seed)
+    base = [rng.randint(0, 255) for _ in range(3)]
+    step = [rng.randint(-2, 2) or 1 for _ in range(3)]
+
+    rows = []
+    for y in range(height):
+        pixel = bytes((base[c] + step[c] * y) % 256 for c in range(3))
+        rows.append(b"\x00" + pixel * width)
+    raw = b"".join(rows)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+
+class LatencyModel:
+    """Latency distribution parsed from "fixed:S", "uniform:A,B",
+    "normal:MEAN,STD" or "lognormal:MU,SIGMA" (seconds)."""
+
+    REFERENCE_PIXELS = 640 * 640
+
+    def __init__(self, spec: str = "fixed:0", scale_by_pixels: bool = False):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        self.scale_by_pixels = scale_by_pixels
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, width: int, height: int) -> float:
+        if self.kind == "fixed":
+            seconds = self.params[0] if self.params else 0.0
+        elif self.kind == "uniform":
+            seconds = random.uniform(*self.params)
+        elif self.kind == "normal":
+            seconds = random.gauss(*self.params)
+        else:
+            seconds = random.lognormvariate(*self.params)
+        if self.scale_by_pixels:
+            seconds *= (width * height) / self.REFERENCE_PIXELS
+        return max(0.0, seconds)
+
+
+class FakeGenerationService(generation_grpc.GenerationServiceServicer):
+    """Stand-in for the Stability Generation service.
+
+    Answers with canned PNGs (artifact_dir) or synthesized gradients, after a
+    sampled delay, and injects RESOURCE_EXHAUSTED / UNAVAILABLE at the given
+    rates. A filter_rate share of images come back blurred with
+    finish_reason FILTER, like the real safety filter. mixed_artifacts
+    packs each image with a text artifact into one answer and interleaves
+    classification answers. Per-key limits: rate_limit requests per minute
+    (RESOURCE_EXHAUSTED) and credits images in total (PERMISSION_DENIED).
+    Keys come from the authorization metadata, falling back to the caller's
+    peer address since the SDK does not send its key over insecure channels.
+    """
+
+    def __init__(self,
+                 latency: LatencyModel = None,
+                 exhausted_rate: float = 0.0,
+                 unavailable_rate: float = 0.0,
+                 filter_rate: float = 0.0,
+                 mixed_artifacts: bool = False,
+                 rate_limit: int = None,
+                 credits: int = None,
+                 artifact_dir: str = None):
+        self.latency = latency or LatencyModel()
+        self.exhausted_rate = exhausted_rate
+        self.unavailable_rate = unavailable_rate
+        self.filter_rate = filter_rate
+        self.mixed_artifacts = mixed_artifacts
+        self.rate_limit = rate_limit
+        self.credits = credits
+        self.canned: List[bytes] = []
+        if artifact_dir:
+            self.canned = [p.read_bytes() for p in sorted(Path(artifact_dir).glob("*.png"))]
+        self.canned_cycle = itertools.cycle(self.canned) if self.canned else None
+
+        self.lock = threading.Lock()
+        self.requests_by_key: Dict[str, List[float]] = defaultdict(list)
+        self.images_by_key: Dict[str, int] = defaultdict(int)
+        self.answer_ids = itertools.count()
+
+    def _caller_key(self, context) -> str:
+        for key, value in context.invocation_metadata():
+            if key == "authorization":
+                return value
+        return context.peer()
+
+    def _admit(self, key: str, samples: int, context):
+        roll = random.random()
+        if roll < self.exhausted_rate:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "injected: server busy")
+        if roll < self.exhausted_rate + self.unavailable_rate:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "injected: service unavailable")
+
+        now = time.time()
+        with self.lock:
+            if self.rate_limit is not None:
+                recent = [t for t in self.requests_by_key[key] if now - t < 60.0]
+                self.requests_by_key[key] = recent
+                if len(recent) >= self.rate_limit:
+                    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "rate limit exceeded")
+                recent.append(now)
+            if self.credits is not None:
+                if self.images_by_key[key] + samples > self.credits:
+                    context.abort(grpc.StatusCode.PERMISSION_DENIED, "insufficient credits")
+                self.images_by_key[key] += samples
+
+    def _artifact(self, width: int, height: int, seed: int, index: int) -> generation.Artifact:
+        if self.canned_cycle:
+            with self.lock:
+                binary = next(self.canned_cycle)
+        else:
+            binary = synthesize_png(width, height, seed)
+        filtered = random.random() < self.filter_rate
+        if filtered:
+            binary = synthesize_png(width, height, 0)
+        return generation.Artifact(
+            id=index,
+            type=generation.ARTIFACT_IMAGE,
+            mime="image/png",
+            binary=binary,
+            seed=seed,
+            index=index,
+            finish_reason=generation.FILTER if filtered else generation.NULL
+        )
+
+    def _answer(self, request_id: str, *artifacts: generation.Artifact) -> generation.Answer:
+        return generation.Answer(
+            answer_id=str(next(self.answer_ids)),
+            request_id=request_id,
+            created=int(time.time()),
+            received=int(time.time()),
+            artifacts=list(artifacts)
+        )
+
+    def _answers(self, request_id: str, artifacts: List[generation.Artifact]):
+        for artifact in artifacts:
+            if not self.mixed_artifacts:
+                yield self._answer(request_id, artifact)
+                continue
+            yield self._answer(request_id, generation.Artifact(
+                type=generation.ARTIFACT_CLASSIFICATIONS, index=artifact.index))
+            caption = generation.Artifact(type=generation.ARTIFACT_TEXT, index=artifact.index,
+                                          mime="text/plain", text=f"sample {artifact.index}")
+            yield self._answer(request_id, caption, artifact)
+
+    def _render(self, request) -> List[generation.Artifact]:
+        params = request.image
+        width = params.width or 512
+        height = params.height or 512
+        samples = params.samples or 1
+        seeds = list(params.seed) or [random.randint(0, 2 ** 32 - 1)]
+
+        time.sleep(self.latency.sample(width, height))
+        return [self._artifact(width, height,
+                               seeds[index] if index < len(seeds) else seeds[0] + index, index)
+                for index in range(samples)]
+
+    def Generate(self, request, context):
+        self._admit(self._caller_key(context), request.image.samples or 1, context)
+        yield from self._answers(request.request_id, self._render(request))
+
+    def ChainGenerate(self, request, context):
+        """Run stages in order from the first, following PASS targets.
+
+        Upscaler stages (esrgan engines) re-render their input at the
+        requested size in a tenth of the latency; only stages with a
+        RETURN action send artifacts back to the caller.
+        """
+        stages = {stage.id: stage for stage in request.stage}
+        samples = sum(stage.request.image.samples or 1 for stage in request.stage
+                      if not stage.request.engine_id.startswith("esrgan"))
+        self._admit(self._caller_key(context), samples, context)
+
+        stage = request.stage[0] if request.stage else None
+        artifacts: List[generation.Artifact] = []
+        while stage is not None:
+            rq = stage.request
+            if rq.engine_id.startswith("esrgan"):
+                time.sleep(self.latency.sample(rq.image.width, rq.image.height) / 10)
+                artifacts = [self._artifact(rq.image.width, rq.image.height, a.seed, a.index)
+                             for a in artifacts]
+            else:
+                artifacts = self._render(rq)
+
+            next_stage = None
+            for on_status in stage.on_status:
+                if generation.STAGE_ACTION_RETURN in on_status.action:
+                    yield from self._answers(request.request_id, artifacts)
+                if generation.STAGE_ACTION_PASS in on_status.action and on_status.target:
+                    next_stage = stages.get(on_status.target)
+            stage = next_stage
+
+
+def serve(port: int = 50051, workers: int = 16, **service_options) -> grpc.Server:
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    generation_grpc.add_GenerationServiceServicer_to_server(
+        FakeGenerationService(**service_options), server)
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    server.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local fake Stability gRPC server for offline benchmarking',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-p', '--port', type=int, default=50051,
+                        help='Port to listen on (127.0.0.1)')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Concurrent requests served')
+    parser.add_argument('--latency', default='lognormal:1.5,0.35',
+                        help='Latency distribution: fixed:S, uniform:A,B,\n'
+                             'normal:MEAN,STD or lognormal:MU,SIGMA (seconds)')
+    parser.add_argument('--scale-by-pixels', action='store_true',
+                        help='Scale latency by pixel count relative to 640x640')
+    parser.add_argument('--exhausted-rate', type=float, default=0.0,
+                        help='Fraction of requests failed with RESOURCE_EXHAUSTED')
+    parser.add_argument('--unavailable-rate', type=float, default=0.0,
+                        help='Fraction of requests failed with UNAVAILABLE')
+    parser.add_argument('--filter-rate', type=float, default=0.0,
+                        help='Fraction of images returned blurred with finish_reason FILTER')
+    parser.add_argument('--mixed-artifacts', action='store_true',
+                        help='Send text and classification artifacts alongside images')
+    parser.add_argument('--rate-limit', type=int,
+                        help='Requests per minute allowed per key')
+    parser.add_argument('--credits', type=int,
+                        help='Images allowed per key before PERMISSION_DENIED')
+    parser.add_argument('--artifact-dir',
+                        help='Serve PNGs from this directory instead of synthesizing them')
+
+    args = parser.parse_args()
+
+    server = serve(
+        port=args.port,
+        workers=args.workers,
+        latency=LatencyModel(args.latency, args.scale_by_pixels),
+        exhausted_rate=args.exhausted_rate,
+        unavailable_rate=args.unavailable_rate,
+        filter_rate=args.filter_rate,
+        mixed_artifacts=args.mixed_artifacts,
+        rate_limit=args.rate_limit,
+        credits=args.credits,
+        artifact_dir=args.artifact_dir
+    )
+    print(f"{EMOJIS['start']} Fake Stability API listening on 127.0.0.1:{args.port}")
+    print(f"{EMOJIS['info']} Point the generator at it with --host localhost:{args.port}")
+    server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ import argparse
 from collections import defaultdict
 import logging
 from datetime import datetime
+from generator import EngineCapabilities
 
 # Emoji constants for logging
 EMOJIS = {
@@ -90,6 +91,12 @@ class ColorManager:
         self.used_colors: Set[str] = set()
         self.color_usage = defaultdict(int)
 
+        # Shuffled deck dealt without replacement, reshuffled once exhausted
+        self.deck = list(requested_colors)
+        random.shuffle(self.deck)
+        self.deck_position = 0
+        self.distinct_colors = len(set(requested_colors))
+
         # Base colors that will always be available
         self.base_colors = [
             "iridescent",
@@ -100,20 +107,19 @@ class ColorManager:
         ]
 
     def get_next_color(self) -> str:
-        unused_colors = [
-            c for c in self.requested_colors if c not in self.used_colors]
+        if self.deck_position >= len(self.deck):
+            random.shuffle(self.deck)
+            self.deck_position = 0
 
-        if unused_colors:
-            chosen_color = random.choice(unused_colors)
-        else:
-            chosen_color = random.choice(self.requested_colors)
+        chosen_color = self.deck[self.deck_position]
+        self.deck_position += 1
 
         self.used_colors.add(chosen_color)
         self.color_usage[chosen_color] += 1
         return chosen_color
 
     def all_colors_used(self) -> bool:
-        return all(color in self.used_colors for color in self.requested_colors)
+        return len(self.used_colors) == self.distinct_colors
 
     def get_usage_summary(self) -> Dict[str, int]:
         return dict(self.color_usage)
@@ -144,11 +150,15 @@ class AlienCeramicsGenerator:
         self.logger.info(
             f"{EMOJIS['color']} Color manager initialized with {len(colors)} colors")
 
+        self.engine = "stable-diffusion-xl-1024-v1-0"
+        # Sizes are snapped to what the engine accepts before each request
+        self.capabilities = EngineCapabilities(self.engine)
+
         try:
             self.stability_api = client.StabilityInference(
                 key=self.api_key,
                 verbose=True,
-                engine="stable-diffusion-xl-1024-v1-0",
+                engine=self.engine,
                 # engine="stable-diffusion-v1-5"
             )
             self._test_connection()
@@ -294,6 +304,7 @@ class AlienCeramicsGenerator:
         for i in range(num_images):
             aspect_ratio = self.get_random_aspect_ratio()
             prompt, chosen_color = self.generate_prompt(aspect_ratio)
+            width, height = self.capabilities.snap(aspect_ratio.width, aspect_ratio.height)
 
             try:
                 self.logger.info(
@@ -303,7 +314,7 @@ class AlienCeramicsGenerator:
                 self.logger.info(
                     f"{EMOJIS['color']} Primary Color: {chosen_color}")
                 self.logger.info(
-                    f"{EMOJIS['dim']} Dimensions: {aspect_ratio.width}x{aspect_ratio.height}")
+                    f"{EMOJIS['dim']} Dimensions: {width}x{height}")
                 self.logger.info(f"{EMOJIS['prompt']} Prompt: {prompt}")
 
                 generation_start = time.time()
@@ -312,8 +323,8 @@ class AlienCeramicsGenerator:
                     seed=seed if seed else random.randint(0, 1000000),
                     steps=30,
                     cfg_scale=7.0,
-                    width=aspect_ratio.width,
-                    height=aspect_ratio.height,
+                    width=width,
+                    height=height,
                     samples=1,
                     sampler=generation.SAMPLER_K_DPMPP_2M
                 )
@@ -330,7 +341,7 @@ class AlienCeramicsGenerator:
                         'prompt': prompt,
                         'color': chosen_color,
                         'aspect_ratio': aspect_ratio.ratio_name,
-                        'dimensions': f"{aspect_ratio.width}x{aspect_ratio.height}",
+                        'dimensions': f"{width}x{height}",
                         'seed': seed if seed else None,
                         'generation_time': f"{generation_time:.2f}s"
                     })
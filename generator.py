@@ -1,7 +1,7 @@
 import os
 import random
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Set, Tuple
 import time
 from dotenv import load_dotenv
 from enum import Enum
@@ -9,8 +9,28 @@ import grpc
 from stability_sdk import client
 import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
 import argparse
-from collections import defaultdict
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import logging
+import queue
+import re
+import atexit
+import heapq
+import importlib.util
+import itertools
+import linecache
+import math
+import shlex
+import sqlite3
+import sys
+import tempfile
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import get_context
 from datetime import datetime
 
 # Emoji constants for logging
@@ -59,6 +79,13 @@ class AspectRatio(Enum):
     def height(self) -> int:
         return self._height
 
+    @classmethod
+    def from_name(cls, ratio_name: str) -> "AspectRatio":
+        for aspect_ratio in cls:
+            if aspect_ratio.ratio_name == ratio_name:
+                return aspect_ratio
+        raise ValueError(f"Unknown aspect ratio: {ratio_name}")
+
 
 class CeramicType(Enum):
     QUANTUM = "quantum"
@@ -70,6 +97,102 @@ class CeramicType(Enum):
     TEMPORAL = "temporal"
 
 
+class AliasSampler:
+    """Walker/Vose alias table: O(1) weighted draws over a fixed index range."""
+
+    def __init__(self, weights: List[float]):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("AliasSampler needs at least one weight")
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+
+        self.size = n
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            large_index = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = large_index
+            scaled[large_index] = (scaled[large_index] + scaled[s]) - 1.0
+            if scaled[large_index] < 1.0:
+                small.append(large_index)
+            else:
+                large.append(large_index)
+        # Leftovers are 1.0 up to float error
+
+    def draw(self, rng=random) -> int:
+        i = int(rng.random() * self.size)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class ColorTable:
+    """Flat color table for one CeramicType with weighted draws without replacement.
+
+    Excluded colors are tracked as a bitmask and every mask reached gets its own
+    alias table, built once and cached, so each draw is a single O(1) alias lookup
+    with no rejection retries.
+    """
+
+    def __init__(self, families: Dict[str, List[str]]):
+        self.colors: List[str] = []
+        self.color_category: List[int] = []
+        self.categories = list(families.keys())
+        self.category_masks: List[int] = []
+
+        category_weights = ColorPalette.get_color_weights(len(self.categories))
+        self.weights: List[float] = []
+        for cat_index, category in enumerate(self.categories):
+            mask = 0
+            members = families[category]
+            for color in members:
+                mask |= 1 << len(self.colors)
+                self.colors.append(color)
+                self.color_category.append(cat_index)
+                self.weights.append(category_weights[cat_index] / len(members))
+            self.category_masks.append(mask)
+
+        self.full_mask = (1 << len(self.colors)) - 1
+        self._samplers: Dict[int, Tuple[List[int], AliasSampler]] = {}
+
+    def _sampler(self, excluded: int) -> Tuple[List[int], AliasSampler]:
+        cached = self._samplers.get(excluded)
+        if cached is None:
+            indices = [i for i in range(len(self.colors))
+                       if not excluded >> i & 1]
+            cached = (indices, AliasSampler(
+                [self.weights[i] for i in indices]))
+            self._samplers[excluded] = cached
+        return cached
+
+    def draw(self, num_colors: int, rng=random) -> List[str]:
+        num_colors = max(1, min(num_colors, len(self.colors)))
+        if num_colors == 1:
+            # A single color always comes from the primary category
+            excluded = self.full_mask & ~self.category_masks[0]
+        else:
+            excluded = 0
+        distinct_categories = num_colors <= len(self.categories)
+
+        picked = []
+        for _ in range(num_colors):
+            indices, sampler = self._sampler(excluded)
+            index = indices[sampler.draw(rng)]
+            picked.append(self.colors[index])
+            if distinct_categories:
+                excluded |= self.category_masks[self.color_category[index]]
+            else:
+                excluded |= 1 << index
+        return picked
+
+    def draw_batch(self, num_colors: int, count: int, rng=random) -> List[List[str]]:
+        return [self.draw(num_colors, rng) for _ in range(count)]
+
+
 class ColorPalette:
     COLOR_FAMILIES = {
         "quantum": {
@@ -172,6 +295,8 @@ class ColorPalette:
         }
     }
 
+    _color_tables: Dict[str, ColorTable] = {}
+
     @classmethod
     def get_random_type(cls) -> CeramicType:
         return random.choice(list(CeramicType))
@@ -185,62 +310,1661 @@ class ColorPalette:
         if ceramic_type.value not in cls.COLOR_FAMILIES:
             print(
                 f"{EMOJIS['warning']} No specific colors found for {ceramic_type.value}, using quantum type instead")
-            type_colors = cls.COLOR_FAMILIES["quantum"]
-        else:
-            type_colors = cls.COLOR_FAMILIES[ceramic_type.value]
-
-        if num_colors == 1:
-            primary_category = next(iter(type_colors.values()))
-            return [random.choice(primary_category)]
-
-        elif num_colors == 2:
-            categories = random.sample(list(type_colors.keys()), 2)
-            return [
-                random.choice(type_colors[categories[0]]),
-                random.choice(type_colors[categories[1]])
-            ]
+            ceramic_type = CeramicType.QUANTUM
 
-        elif num_colors == 3:
-            categories = random.sample(list(type_colors.keys()), 3)
-            return [
-                random.choice(type_colors[cat]) for cat in categories
-            ]
+        return cls.get_color_table(ceramic_type).draw(num_colors)
 
-        else:  # num_colors == 4
-            all_colors = []
-            categories = list(type_colors.keys())
-
-            while len(all_colors) < 4:
-                category = random.choice(categories)
-                color = random.choice(type_colors[category])
-                if color not in all_colors:
-                    all_colors.append(color)
+    @classmethod
+    def get_color_table(cls, ceramic_type: CeramicType) -> ColorTable:
+        table = cls._color_tables.get(ceramic_type.value)
+        if table is None:
+            table = ColorTable(cls.COLOR_FAMILIES[ceramic_type.value])
+            cls._color_tables[ceramic_type.value] = table
+        return table
 
-            return all_colors
+    @classmethod
+    def sample_harmonic_colors(cls, ceramic_type: CeramicType, num_colors: int,
+                               count: int) -> List[List[str]]:
+        if ceramic_type.value not in cls.COLOR_FAMILIES:
+            ceramic_type = CeramicType.QUANTUM
+        return cls.get_color_table(ceramic_type).draw_batch(num_colors, count)
 
     @classmethod
     def get_color_weights(cls, num_colors: int) -> List[float]:
+        if num_colors < 1:
+            raise ValueError(f"Need at least one color, got {num_colors}")
         if num_colors == 1:
             return [1.0]
         elif num_colors == 2:
             return [0.6, 0.4]
         elif num_colors == 3:
             return [0.5, 0.3, 0.2]
-        else:  # num_colors == 4
-            return [0.4, 0.3, 0.2, 0.1]
+        # Linearly decreasing shares: 0.4, 0.3, 0.2, 0.1 for four colors
+        total = num_colors * (num_colors + 1) / 2
+        return [(num_colors - i) / total for i in range(num_colors)]
+
+
+COLOR_GUIDES = [
+    Path(__file__).parent / "colors.md",
+    Path(__file__).parent / "colors-advanced.md"
+]
+
+
+def load_color_guide(guide_path: Path) -> List[Tuple[str, str]]:
+    """Return (color, section) pairs listed in a colors*.md guide."""
+    entries = []
+    section = None
+    for line in guide_path.read_text(encoding="utf-8").splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#") and not stripped.startswith("# "):
+            section = stripped.lstrip("#").strip()
+        elif stripped.startswith("- `"):
+            entries.append((stripped.split("`")[1], section))
+        elif stripped.startswith("python generator.py"):
+            for token in shlex.split(stripped)[2:]:
+                if token.startswith("-"):
+                    break
+                entries.append((token, section))
+    return entries
+
+
+class ColorIndex:
+    """Trigram index over every known color name.
+
+    Exact matches are a single dict lookup; anything else is ranked by the
+    Dice coefficient of shared trigrams, so only names sharing at least one
+    trigram with the query are ever scored.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.entries: Dict[str, List[Dict]] = {}
+        self.trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self.trigram_counts: List[int] = []
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return " ".join(name.lower().split())
+
+    @staticmethod
+    def grams(name: str) -> Set[str]:
+        padded = f"  {name} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, name: str, ceramic_type: CeramicType = None, category: str = None):
+        key = self.normalize(name)
+        if key not in self.entries:
+            self.entries[key] = []
+            name_id = len(self.names)
+            self.names.append(key)
+            grams = self.grams(key)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigrams[gram].add(name_id)
+        entry = {'color': key, 'ceramic_type': ceramic_type, 'category': category}
+        if entry not in self.entries[key]:
+            self.entries[key].append(entry)
+
+    @classmethod
+    def build(cls, guides: List[Path] = None) -> "ColorIndex":
+        index = cls()
+        for type_name, families in ColorPalette.COLOR_FAMILIES.items():
+            for category, colors in families.items():
+                for color in colors:
+                    index.add(color, CeramicType(type_name), category)
+        for guide in COLOR_GUIDES if guides is None else guides:
+            if guide.exists():
+                for color, section in load_color_guide(guide):
+                    if not index.lookup(color):
+                        index.add(color, None, section)
+        return index
+
+    def lookup(self, name: str) -> List[Dict]:
+        return self.entries.get(self.normalize(name), [])
+
+    def suggest(self, name: str, limit: int = 3, min_score: float = 0.3) -> List[Tuple[str, float]]:
+        grams = self.grams(self.normalize(name))
+        shared = defaultdict(int)
+        for gram in grams:
+            for name_id in self.trigrams.get(gram, ()):
+                shared[name_id] += 1
+
+        scored = [
+            (self.names[name_id], 2.0 * count / (len(grams) + self.trigram_counts[name_id]))
+            for name_id, count in shared.items()
+        ]
+        scored = [item for item in scored if item[1] >= min_score]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def resolve(self, name: str) -> Dict:
+        matches = self.lookup(name)
+        return {
+            'input': name,
+            'matches': matches,
+            'suggestions': [] if matches else self.suggest(name)
+        }
+
+    def infer_type_weights(self, colors: List[str]) -> Dict[CeramicType, float]:
+        weights = defaultdict(float)
+        for color in colors:
+            typed = [e['ceramic_type'] for e in self.lookup(color) if e['ceramic_type']]
+            for ceramic_type in typed:
+                weights[ceramic_type] += 1.0 / len(typed)
+        return dict(weights)
 
 
-def get_random_colors() -> Tuple[List[str], List[float], CeramicType]:
-    ceramic_type = ColorPalette.get_random_type()
+def get_random_colors(ceramic_type: CeramicType = None) -> Tuple[List[str], List[float], CeramicType]:
+    if ceramic_type is None:
+        ceramic_type = ColorPalette.get_random_type()
     num_colors = random.randint(1, 4)
     colors = ColorPalette.get_harmonic_colors(ceramic_type, num_colors)
     weights = ColorPalette.get_color_weights(num_colors)
     return colors, weights, ceramic_type
 
 
+class BatchPlanner:
+    """Allocates a batch across CeramicType x classification x AspectRatio strata.
+
+    Target proportions are given per dimension (missing weights default to
+    uniform). Each dimension's counts use largest-remainder rounding on its
+    own, so small batches still cover every type, category and aspect
+    ratio. The three marginals are then paired round-robin: every dimension
+    cycles through its values evenly spread, so with coprime dimension sizes
+    (7 types x 5 aspects) pairs and the full joint product are covered in as
+    few images as possible.
+    """
+
+    def __init__(self,
+                 categories: List[str],
+                 type_weights: Dict[CeramicType, float] = None,
+                 category_weights: Dict[str, float] = None,
+                 aspect_weights: Dict[AspectRatio, float] = None):
+        self.type_weights = self._normalize(list(CeramicType), type_weights)
+        self.category_weights = self._normalize(categories, category_weights)
+        self.aspect_weights = self._normalize(list(AspectRatio), aspect_weights)
+
+    @staticmethod
+    def _normalize(keys: List, weights: Dict = None) -> Dict:
+        if not weights:
+            weights = {key: 1.0 for key in keys}
+        unknown = [key for key in weights if key not in keys]
+        if unknown:
+            raise ValueError(f"Unknown plan keys: {unknown}")
+        total = float(sum(weights.values()))
+        if total <= 0:
+            raise ValueError("Plan weights must sum to a positive value")
+        return {key: weights[key] / total for key in keys if weights.get(key, 0) > 0}
+
+    @staticmethod
+    def largest_remainder(weights: Dict, num_images: int) -> Dict:
+        quotas = [(key, num_images * share) for key, share in weights.items()]
+        counts = {key: int(quota) for key, quota in quotas}
+
+        remaining = num_images - sum(counts.values())
+        # Random tie-break so equal remainders don't always favour the same keys
+        by_remainder = sorted(
+            quotas, key=lambda kq: (kq[1] - int(kq[1]), random.random()), reverse=True)
+        for key, _ in by_remainder[:remaining]:
+            counts[key] += 1
+        return counts
+
+    @classmethod
+    def round_robin(cls, weights: Dict, num_images: int) -> List:
+        """Marginal counts laid out so each value recurs at even intervals."""
+        counts = cls.largest_remainder(weights, num_images)
+        keys = list(counts)
+        random.shuffle(keys)
+        slots = [((j + 0.5) / counts[key], order, key)
+                 for order, key in enumerate(keys) for j in range(counts[key])]
+        return [key for _, _, key in sorted(slots, key=lambda slot: slot[:2])]
+
+    def allocate(self, num_images: int) -> Dict[Tuple[CeramicType, str, AspectRatio], int]:
+        columns = zip(self.round_robin(self.type_weights, num_images),
+                      self.round_robin(self.category_weights, num_images),
+                      self.round_robin(self.aspect_weights, num_images))
+        counts = defaultdict(int)
+        for key in columns:
+            counts[key] += 1
+        return dict(counts)
+
+    def plan(self, num_images: int) -> List[Dict]:
+        plan = []
+        for (ceramic_type, category, aspect_ratio), count in self.allocate(num_images).items():
+            plan.extend({
+                'ceramic_type': ceramic_type,
+                'category': category,
+                'aspect_ratio': aspect_ratio
+            } for _ in range(count))
+        random.shuffle(plan)
+        return plan
+
+
+class ConsoleFilter(logging.Filter):
+    """Console verbosity: "all", "quiet" (warnings and errors only) or
+    "sampled" (every Nth info line plus all warnings and errors)."""
+
+    def __init__(self, mode: str = "all", sample_every: int = 10):
+        super().__init__()
+        self.configure(mode, sample_every)
+
+    def configure(self, mode: str, sample_every: int):
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.mode == "all":
+            return True
+        if self.mode == "quiet":
+            return False
+        self.seen += 1
+        return (self.seen - 1) % self.sample_every == 0
+
+
+_log_listener = None
+_console_filter = None
+
+
+def setup_logging(console_mode: str = "all", sample_every: int = 10) -> logging.Logger:
+    """Route the AlienCeramics logger through a queue drained by a background thread.
+
+    Handlers are only registered once per process; later calls just adjust the
+    console mode, so several generators never duplicate log lines.
+    """
+    global _log_listener, _console_filter
+
+    logger = logging.getLogger("AlienCeramics")
+    if _log_listener is not None:
+        _console_filter.configure(console_mode, sample_every)
+        return logger
+
+    log_dir = Path("logs")
+    log_dir.mkdir(exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_file = log_dir / f"ceramic_generation_{timestamp}.log"
+
+    logger.setLevel(logging.INFO)
+
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    console_handler = logging.StreamHandler()
+
+    file_formatter = logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s')
+    console_formatter = logging.Formatter('%(message)s')
+
+    file_handler.setFormatter(file_formatter)
+    console_handler.setFormatter(console_formatter)
+    _console_filter = ConsoleFilter(console_mode, sample_every)
+    console_handler.addFilter(_console_filter)
+
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
+    return logger
+
+
+class GenerationMetrics:
+    """Thread-safe counters exposed in the Prometheus text format.
+
+    Served on a local HTTP port (serve) or written as a node-exporter
+    textfile-collector file (textfile). Updates only mark the file dirty; a
+    single background writer rewrites it at most every WRITE_INTERVAL seconds,
+    so worker threads never block on disk or race each other on the rename.
+    """
+
+    LATENCY_BUCKETS = (1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0)
+    RATE_WINDOW = 60.0
+    WRITE_INTERVAL = 1.0
+
+    def __init__(self, textfile: str = None):
+        self.textfile = Path(textfile) if textfile else None
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.latency_buckets = defaultdict(lambda: [0] * len(self.LATENCY_BUCKETS))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+        self.status_counts = defaultdict(int)
+        self.in_flight = 0
+        self.bytes_written = 0
+        self.images = 0
+        self.recent_images = deque()
+        self.server = None
+        self.dirty = threading.Event()
+        self.closed = threading.Event()
+        self.writer = None
+        if self.textfile is not None:
+            self.writer = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+
+    def observe_latency(self, aspect_ratio: str, engine: str, seconds: float):
+        key = (aspect_ratio, engine)
+        with self.lock:
+            buckets = self.latency_buckets[key]
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.latency_sum[key] += seconds
+            self.latency_count[key] += 1
+        self.flush()
+
+    def record_status(self, code: str):
+        with self.lock:
+            self.status_counts[code] += 1
+        self.flush()
+
+    def add_in_flight(self, delta: int):
+        with self.lock:
+            self.in_flight += delta
+        self.flush()
+
+    def record_image(self, num_bytes: int):
+        now = time.time()
+        with self.lock:
+            self.images += 1
+            self.bytes_written += num_bytes
+            self.recent_images.append(now)
+        self.flush()
+
+    def images_per_minute(self) -> float:
+        now = time.time()
+        with self.lock:
+            while self.recent_images and now - self.recent_images[0] > self.RATE_WINDOW:
+                self.recent_images.popleft()
+            window = min(self.RATE_WINDOW, max(now - self.started, 1e-9))
+            return len(self.recent_images) * 60.0 / window
+
+    def render(self) -> str:
+        per_minute = self.images_per_minute()
+        prefix = "alien_ceramics"
+        lines = []
+        with self.lock:
+            lines.append(f"# HELP {prefix}_generation_latency_seconds Time from request to last artifact")
+            lines.append(f"# TYPE {prefix}_generation_latency_seconds histogram")
+            for (aspect_ratio, engine), buckets in sorted(self.latency_buckets.items()):
+                labels = f'aspect_ratio="{aspect_ratio}",engine="{engine}"'
+                for bound, count in zip(self.LATENCY_BUCKETS, buckets):
+                    lines.append(
+                        f'{prefix}_generation_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                count = self.latency_count[(aspect_ratio, engine)]
+                lines.append(
+                    f'{prefix}_generation_latency_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(
+                    f'{prefix}_generation_latency_seconds_sum{{{labels}}} {self.latency_sum[(aspect_ratio, engine)]:.6f}')
+                lines.append(f'{prefix}_generation_latency_seconds_count{{{labels}}} {count}')
+
+            lines.append(f"# HELP {prefix}_requests_total Generation requests by gRPC status code")
+            lines.append(f"# TYPE {prefix}_requests_total counter")
+            for code, count in sorted(self.status_counts.items()):
+                lines.append(f'{prefix}_requests_total{{code="{code}"}} {count}')
+
+            lines.append(f"# HELP {prefix}_requests_in_flight Requests currently streaming")
+            lines.append(f"# TYPE {prefix}_requests_in_flight gauge")
+            lines.append(f"{prefix}_requests_in_flight {self.in_flight}")
+
+            lines.append(f"# HELP {prefix}_bytes_written_total Artifact bytes written to disk")
+            lines.append(f"# TYPE {prefix}_bytes_written_total counter")
+            lines.append(f"{prefix}_bytes_written_total {self.bytes_written}")
+
+            lines.append(f"# HELP {prefix}_images_total Images written to disk")
+            lines.append(f"# TYPE {prefix}_images_total counter")
+            lines.append(f"{prefix}_images_total {self.images}")
+
+        lines.append(f"# HELP {prefix}_images_per_minute Images written over the last minute")
+        lines.append(f"# TYPE {prefix}_images_per_minute gauge")
+        lines.append(f"{prefix}_images_per_minute {per_minute:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        self.dirty.set()
+
+    def _write_loop(self):
+        while not self.closed.is_set():
+            self.dirty.wait()
+            self.dirty.clear()
+            try:
+                self.write_textfile()
+            except OSError as e:
+                logging.getLogger(__name__).warning(
+                    f"{EMOJIS['warning']} Could not write metrics file: {e}")
+            self.closed.wait(self.WRITE_INTERVAL)
+
+    def write_textfile(self):
+        # Write-then-rename so the collector never reads a half-written file
+        with tempfile.NamedTemporaryFile("w", dir=self.textfile.parent, prefix=self.textfile.name,
+                                         suffix=".tmp", delete=False) as tmp_file:
+            tmp_file.write(self.render())
+        os.replace(tmp_file.name, self.textfile)
+
+    def close(self):
+        """Stops the writer and leaves the final counters on disk."""
+        if self.writer is None or self.closed.is_set():
+            return
+        self.closed.set()
+        self.dirty.set()
+        self.writer.join()
+        self.write_textfile()
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+
+class Tracer:
+    """Collects per-stage spans and exports them as a Chrome trace-event file.
+
+    Open the file in chrome://tracing or https://ui.perfetto.dev; each image
+    gets its own lane so the stages of one generation line up.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = Path(path) if path else None
+        self.events: List[Dict] = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(self, name: str, start: float, end: float, lane: int = 0, **args):
+        if not self.enabled:
+            return
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': lane,
+            'args': args
+        }
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, lane: int = 0, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), lane, **args)
+
+    def export(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            trace = {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+        with open(self.path, 'w') as f:
+            json.dump(trace, f)
+
+
+class SamplingProfiler:
+    """Samples every thread's Python stack on an interval.
+
+    Writes collapsed stacks ("frame;frame;frame count" lines, the input of
+    flamegraph.pl and speedscope) and summarises samples by pipeline stage.
+    Stages are matched by the function or module of each frame, from the
+    innermost frame outwards, so a logging call made while building a prompt
+    is counted as logging; threads parked in a blocking call are counted as
+    waiting.
+    """
+
+    STAGES = [
+        ("logging", lambda f, fn: f"{os.sep}logging{os.sep}" in f),
+        ("protobuf parsing", lambda f, fn: f"{os.sep}protobuf{os.sep}" in f),
+        ("grpc streaming", lambda f, fn: f"{os.sep}grpc{os.sep}" in f or "stability_sdk" in f),
+        ("file I/O", lambda f, fn: fn in (
+            "write_image", "write_manifest", "write_textfile") or Path(f).name == "_pyio.py"),
+        ("prompt building", lambda f, fn: fn in (
+            "generate_prompt", "get_random_colors", "get_harmonic_colors", "draw")),
+    ]
+    # Source fragments of calls that block; a thread parked on one is idle
+    IDLE_CALLS = ("sleep(", ".acquire(", "queue.get(", ".select(", ".poll(")
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = defaultdict(int)
+        self.stages = defaultdict(int)
+        self.self_time = defaultdict(int)
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def classify(self, frames: List) -> str:
+        leaf = frames[0]
+        leaf_line = linecache.getline(leaf.f_code.co_filename, leaf.f_lineno)
+        if any(call in leaf_line for call in self.IDLE_CALLS):
+            return "waiting"
+        for frame in frames:
+            filename = frame.f_code.co_filename
+            function = frame.f_code.co_name
+            for stage, matches in self.STAGES:
+                if matches(filename, function):
+                    return stage
+        return "other"
+
+    def sample(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            if not frames:
+                continue
+            names = [f"{f.f_code.co_name} ({Path(f.f_code.co_filename).name}:{f.f_code.co_firstlineno})"
+                     for f in reversed(frames)]
+            self.stacks[";".join(names)] += 1
+            self.self_time[names[-1]] += 1
+            self.stages[self.classify(frames)] += 1
+            self.samples += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+    def summary(self, top: int = 20) -> str:
+        total = max(1, self.samples)
+        busy = max(1, total - self.stages.get("waiting", 0))
+        lines = [f"{EMOJIS['time']} {self.samples} samples every {self.interval * 1000:.0f}ms",
+                 "Time by stage (share of busy samples):"]
+        for stage, count in sorted(self.stages.items(), key=lambda kv: kv[1], reverse=True):
+            share = "" if stage == "waiting" else f" {count / busy:6.1%}"
+            lines.append(f"  {stage:<18} {count:>7}{share}")
+        lines.append(f"Top {top} frames by self samples:")
+        for name, count in sorted(self.self_time.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            lines.append(f"  {count / total:6.1%} {count:>7}  {name}")
+        return "\n".join(lines)
+
+
+class EngineCapabilities:
+    """What an engine accepts: dimensions, step range and samplers.
+
+    Engines either take a fixed list of sizes (SDXL) or any size on a grid
+    within side and pixel limits. Requests are snapped locally so a bad size
+    never costs an INVALID_ARGUMENT round trip.
+    """
+
+    # Samplers the v1 API documents for its diffusion engines. K_DPMPP_SDE
+    # exists in the protobuf enum but is not accepted by these engines
+    DIFFUSION_SAMPLERS = (
+        generation.SAMPLER_DDIM, generation.SAMPLER_DDPM, generation.SAMPLER_K_EULER,
+        generation.SAMPLER_K_EULER_ANCESTRAL, generation.SAMPLER_K_HEUN,
+        generation.SAMPLER_K_DPM_2, generation.SAMPLER_K_DPM_2_ANCESTRAL,
+        generation.SAMPLER_K_LMS, generation.SAMPLER_K_DPMPP_2S_ANCESTRAL,
+        generation.SAMPLER_K_DPMPP_2M
+    )
+
+    ENGINES = {
+        "stable-diffusion-xl-1024-v1-0": {
+            "sizes": [(1024, 1024), (1152, 896), (896, 1152), (1216, 832), (832, 1216),
+                      (1344, 768), (768, 1344), (1536, 640), (640, 1536)],
+            "steps": (10, 50),
+            "samplers": DIFFUSION_SAMPLERS,
+        },
+        "stable-diffusion-v1-6": {
+            "grid": 64, "min_side": 320, "max_side": 1536, "max_pixels": 1024 * 1024,
+            "steps": (10, 50),
+            "samplers": DIFFUSION_SAMPLERS,
+        },
+        "stable-diffusion-512-v2-1": {
+            "grid": 64, "min_side": 128, "max_side": 1024, "max_pixels": 512 * 896,
+            "steps": (10, 150),
+            "samplers": DIFFUSION_SAMPLERS,
+        },
+    }
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.spec = self.ENGINES.get(engine)
+        # Unknown engines get whatever sampler is asked for, like their sizes
+        self.samplers = self.spec["samplers"] if self.known else None
+
+    @property
+    def known(self) -> bool:
+        return self.spec is not None
+
+    def snap(self, width: int, height: int) -> Tuple[int, int]:
+        if not self.known:
+            return width, height
+
+        if "sizes" in self.spec:
+            # Closest aspect ratio first, then closest pixel count
+            target = math.log(width / height)
+            return min(self.spec["sizes"], key=lambda wh: (
+                round(abs(math.log(wh[0] / wh[1]) - target), 3),
+                abs(wh[0] * wh[1] - width * height)))
+
+        grid = self.spec["grid"]
+
+        def to_grid(side: float) -> int:
+            side = max(self.spec["min_side"], min(self.spec["max_side"], side))
+            return max(grid, int(round(side / grid)) * grid)
+
+        snapped_w, snapped_h = to_grid(width), to_grid(height)
+        if snapped_w * snapped_h > self.spec["max_pixels"]:
+            scale = math.sqrt(self.spec["max_pixels"] / (width * height))
+            snapped_w = max(grid, int(width * scale // grid) * grid)
+            snapped_h = max(grid, int(height * scale // grid) * grid)
+        return snapped_w, snapped_h
+
+    def clamp_steps(self, steps: int) -> int:
+        if not self.known:
+            return steps
+        low, high = self.spec["steps"]
+        return max(low, min(high, steps))
+
+    def supports_sampler(self, sampler) -> bool:
+        return self.samplers is None or sampler in self.samplers
+
+
+def write_image(path: Path, binary: bytes):
+    """Writes artifact bytes to disk; a frame of its own so profiles see file I/O."""
+    with open(path, 'wb') as f:
+        f.write(binary)
+
+
+def upscale_file(path: str, factor: int = 2) -> Dict:
+    """Lanczos-upscale a PNG and write it next to the original as *_x{factor}.png."""
+    # Pillow ships with stability-sdk; imported here so only pool workers pay for it
+    from PIL import Image
+
+    start = time.perf_counter()
+    source = Path(path)
+    target = source.with_name(f"{source.stem}_x{factor}{source.suffix}")
+    with Image.open(source) as image:
+        size = (image.width * factor, image.height * factor)
+        image.resize(size, Image.LANCZOS).save(target)
+    return {
+        'upscaled_filename': str(target),
+        'upscaled_dimensions': f"{size[0]}x{size[1]}",
+        'upscale_seconds': time.perf_counter() - start
+    }
+
+
+class LocalUpscaler:
+    """Upscales saved artifacts on local CPUs while dispatch carries on.
+
+    Jobs run in a spawned process pool (forking a process with live gRPC
+    threads is unsafe). drain() waits for the outstanding jobs and merges
+    their output into the result dicts they were submitted with.
+    """
+
+    def __init__(self, factor: int = 2, workers: int = None):
+        self.factor = factor
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.pending: List[Tuple[Dict, object]] = []
+        self.lock = threading.Lock()
+
+    def submit(self, result: Dict):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=get_context("spawn"))
+            self.pending.append((result, self.pool.submit(upscale_file, result['filename'],
+                                                          self.factor)))
+
+    def drain(self) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for result, future in pending:
+            try:
+                result.update(future.result())
+            except Exception as e:
+                result['upscale_error'] = str(e)
+        return len(pending)
+
+    def shutdown(self):
+        self.drain()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def perceptual_hashes(image) -> Dict[str, str]:
+    """64-bit dHash and pHash of a decoded image as hex strings."""
+    import numpy as np
+    from PIL import Image
+
+    gray = image.convert("L")
+    gradient = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    pixels = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+
+    # dHash: is each pixel brighter than its right-hand neighbour
+    dhash_bits = (gradient[:, 1:] > gradient[:, :-1]).ravel()
+
+    # pHash: low 8x8 frequencies of a 2-D DCT-II against their median
+    n = np.arange(32)
+    basis = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    low = (basis @ pixels @ basis.T)[:8, :8].ravel()
+    phash_bits = low > np.median(low[1:])
+
+    def to_hex(bits) -> str:
+        return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+    return {'dhash': to_hex(dhash_bits), 'phash': to_hex(phash_bits)}
+
+
+def srgb_to_lab(rgb):
+    """CIE L*a*b* (D65) of an (N, 3) array of 0-255 sRGB values."""
+    import numpy as np
+
+    linear = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(linear > 0.04045, ((linear + 0.055) / 1.055) ** 2.4, linear / 12.92)
+    xyz = linear @ np.array([[0.4124, 0.3576, 0.1805],
+                             [0.2126, 0.7152, 0.0722],
+                             [0.0193, 0.1192, 0.9505]]).T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([116 * f[:, 1] - 16,
+                     500 * (f[:, 0] - f[:, 1]),
+                     200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def dominant_colors(image, k: int = 5, size: int = 64, iterations: int = 12) -> List[Dict]:
+    """k-means in Lab space over a downsampled copy; clusters by share, largest first."""
+    import numpy as np
+
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((size, size))
+    rgb = np.asarray(thumbnail, dtype=np.float64).reshape(-1, 3)
+    lab = srgb_to_lab(rgb)
+
+    # Deterministic spread-out start: pixels at evenly spaced lightness ranks
+    order = np.argsort(lab[:, 0])
+    centers = lab[order[np.linspace(0, len(order) - 1, k).astype(int)]]
+    for _ in range(iterations):
+        distances = ((lab[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, lab[:, c], minlength=k) for c in range(3)], axis=1)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(moved, centers):
+            break
+        centers = moved
+
+    clusters = []
+    for cluster in np.argsort(-counts):
+        if not counts[cluster]:
+            continue
+        mean_rgb = rgb[labels == cluster].mean(axis=0).round().astype(int)
+        clusters.append({
+            'hex': "#{:02x}{:02x}{:02x}".format(*mean_rgb),
+            'lab': [round(float(v), 2) for v in centers[cluster]],
+            'share': round(float(counts[cluster] / len(labels)), 4)
+        })
+    return clusters
+
+
+def analyze_image(path: str, tasks: Tuple[str, ...]) -> Dict:
+    """Decode a PNG once and run every requested analysis on it."""
+    # numpy is only needed for these stages; Pillow ships with stability-sdk
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+    analyses = {'hashes': perceptual_hashes, 'colors': dominant_colors}
+    return {task: analyses[task](image) for task in tasks}
+
+
+class ImageAnalyzer:
+    """Post-processing stages fed from one spawned process pool.
+
+    Each written image is decoded once in a worker that runs the task of
+    every stage; the stages then merge the output into the result dict in
+    a completion callback, while dispatch carries on. A future counts as
+    done before its callbacks have run, so drain() waits on a count of
+    unfinished callbacks rather than on the futures.
+    """
+
+    def __init__(self, stages: List, workers: int = None):
+        self.stages = stages
+        self.tasks = tuple(stage.task for stage in stages)
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.outstanding = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+    def submit(self, result: Dict):
+        def done(future):
+            try:
+                output = future.result()
+                for stage in self.stages:
+                    stage.process(result, output[stage.task])
+            except Exception as e:
+                result['analysis_error'] = str(e)
+            finally:
+                with self.lock:
+                    self.outstanding -= 1
+                    if not self.outstanding:
+                        self.idle.notify_all()
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=get_context("spawn"))
+            future = self.pool.submit(analyze_image, result['filename'], self.tasks)
+            self.outstanding += 1
+        future.add_done_callback(done)
+
+    def drain(self):
+        with self.lock:
+            while self.outstanding:
+                self.idle.wait()
+        for stage in self.stages:
+            stage.save()
+
+    def shutdown(self):
+        self.drain()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+
+    A radius-r search only descends into children whose edge distance is
+    within r of the query's distance to the node, so lookups touch a small
+    fraction of the stored hashes.
+    """
+
+    def __init__(self):
+        # Node: [hash, payload, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, value: int, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, payload, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, payload, {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        matches = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                matches.append((distance, node[1]))
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return sorted(matches, key=lambda match: match[0])
+
+
+class DuplicateDetector:
+    """Flags near-duplicate images within a run and against earlier runs.
+
+    Hashes come from the ImageAnalyzer pool as images are written; matches
+    are found by pHash in a BK-tree and confirmed by dHash, and the index
+    persists as JSON so later runs see earlier output.
+    """
+
+    DEFAULT_PATH = Path("logs") / "phash_index.json"
+    task = "hashes"
+
+    def __init__(self, path: Path = None, threshold: int = 6):
+        self.path = Path(path) if path else self.DEFAULT_PATH
+        self.threshold = threshold
+        self.run = datetime.now().isoformat(timespec='seconds')
+        self.entries: List[Dict] = []
+        self.tree = BKTree()
+        # Called with (result, match) for every near-duplicate
+        self.on_duplicate = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path = None, threshold: int = 6) -> "DuplicateDetector":
+        detector = cls(path, threshold)
+        if detector.path.exists():
+            with open(detector.path) as f:
+                for entry in json.load(f):
+                    detector.add(entry)
+        return detector
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.entries, indent=1)
+        self.path.write_text(data)
+
+    def add(self, entry: Dict):
+        self.entries.append(entry)
+        self.tree.add(int(entry['phash'], 16), entry)
+
+    def check(self, result: Dict, hashes: Dict[str, str]) -> Dict:
+        """Annotate result with its hashes and closest match; returns the match."""
+        phash, dhash = int(hashes['phash'], 16), int(hashes['dhash'], 16)
+        with self.lock:
+            match = next((entry for distance, entry in self.tree.search(phash, self.threshold)
+                          if hamming(dhash, int(entry['dhash'], 16)) <= self.threshold), None)
+            self.add({'filename': result['filename'], 'run': self.run, **hashes})
+        result.update(hashes)
+        if match:
+            result['near_duplicate_of'] = match['filename']
+            result['duplicate_scope'] = "run" if match['run'] == self.run else "previous run"
+        return match
+
+    def process(self, result: Dict, hashes: Dict[str, str]):
+        match = self.check(result, hashes)
+        if match and self.on_duplicate:
+            self.on_duplicate(result, match)
+
+
+class ColorVerifier:
+    """Scores how well each image matches its requested color.
+
+    Dominant colors (k-means from the ImageAnalyzer pool) are named after
+    the closest base hue of the palette and compared in Lab against the
+    requested color: its base hue shifted by the lightness and chroma of the
+    modifier words in its name, so "void blue" and "plasma blue" get
+    different targets. An inverted index from base hue to images persists as
+    JSON, so "stellar images that came out gold" is a dictionary lookup.
+    """
+
+    DEFAULT_PATH = Path("logs") / "color_index.json"
+    task = "colors"
+    # Base hues every palette name ends in
+    BASE_COLORS = {
+        "white": (245, 245, 245), "black": (15, 15, 20), "grey": (128, 128, 128),
+        "silver": (192, 192, 200), "platinum": (229, 228, 226), "pearl": (234, 224, 200),
+        "gold": (212, 175, 55), "yellow": (240, 220, 40), "orange": (240, 130, 30),
+        "red": (200, 30, 40), "magenta": (200, 40, 160), "purple": (120, 50, 160),
+        "violet": (140, 80, 210), "indigo": (75, 0, 130), "blue": (30, 80, 200),
+        "azure": (0, 127, 255), "cyan": (0, 200, 220), "teal": (0, 128, 128),
+        "turquoise": (64, 224, 208), "green": (40, 170, 70)
+    }
+    # Modifier word -> (lightness shift, chroma scale) applied to the base hue in Lab
+    MODIFIERS = {
+        "pale": (15, 0.5), "pastel": (18, 0.45), "light": (12, 0.8), "soft": (8, 0.7),
+        "muted": (0, 0.6), "dusty": (5, 0.5), "deep": (-15, 1.1), "dark": (-20, 0.9),
+        "burnished": (-10, 0.8), "metallic": (-5, 0.7), "bright": (8, 1.2),
+        "vivid": (0, 1.3), "electric": (5, 1.35), "neon": (10, 1.4),
+        "luminous": (12, 1.15), "bioluminescent": (10, 1.3), "aurora": (8, 1.2),
+        "plasma": (8, 1.25), "nova": (10, 1.1), "solar": (8, 1.15), "corona": (10, 1.1),
+        "photosphere": (10, 1.0), "quasar": (10, 1.2), "radiation": (5, 1.2),
+        "nebula": (-5, 1.1), "cosmic": (-8, 1.1), "void": (-20, 0.8), "vacuum": (-8, 0.8),
+        "magma": (-8, 1.15), "mineral": (-10, 0.75), "ore": (-12, 0.6), "tectonic": (-10, 0.8),
+        "crystal": (10, 0.9), "atmospheric": (10, 0.7), "atmosphere": (10, 0.7),
+        "stratosphere": (8, 0.75), "ionosphere": (5, 0.8), "ozone": (8, 0.7),
+        "foam": (5, 0.6), "membrane": (5, 0.7), "cytoplasm": (5, 0.8),
+        "entropy": (0, 0.6), "echo": (5, 0.6),
+    }
+    MIN_SHARE = 0.05
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else self.DEFAULT_PATH
+        # base hue -> [{filename, ceramic_type, share, delta_e}]
+        self.index: Dict[str, List[Dict]] = defaultdict(list)
+        self._base_lab = None
+        # Requested color -> images that could not be scored against it
+        self.unscored: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    @property
+    def base_lab(self) -> Dict[str, List[float]]:
+        # Computed on first use so index queries work without numpy
+        if self._base_lab is None:
+            labs = srgb_to_lab(list(self.BASE_COLORS.values())).tolist()
+            self._base_lab = dict(zip(self.BASE_COLORS, labs))
+        return self._base_lab
+
+    @classmethod
+    def load(cls, path: Path = None) -> "ColorVerifier":
+        verifier = cls(path)
+        if verifier.path.exists():
+            with open(verifier.path) as f:
+                verifier.index.update(json.load(f))
+        return verifier
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.index, indent=1, sort_keys=True, ensure_ascii=False)
+        self.path.write_text(data)
+
+    @classmethod
+    def base_color(cls, name: str) -> str:
+        for word in reversed(name.lower().replace("-", " ").split()):
+            if word in cls.BASE_COLORS:
+                return word
+        return None
+
+    def lab_for(self, name: str) -> List[float]:
+        """Lab target for a color name, or None without a recognised base hue."""
+        base = self.base_color(name)
+        if base is None:
+            return None
+        lightness, a, b = self.base_lab[base]
+        for word in name.lower().replace("-", " ").split():
+            shift, chroma = self.MODIFIERS.get(word, (0, 1.0))
+            lightness = min(100.0, max(0.0, lightness + shift))
+            a, b = a * chroma, b * chroma
+        return [lightness, a, b]
+
+    def take_unscored(self) -> Dict[str, int]:
+        with self.lock:
+            unscored, self.unscored = dict(self.unscored), defaultdict(int)
+        return unscored
+
+    @staticmethod
+    def delta_e(a: List[float], b: List[float]) -> float:
+        return math.dist(a, b)
+
+    def nearest_base(self, lab: List[float]) -> Tuple[str, float]:
+        return min(((name, self.delta_e(lab, base)) for name, base in self.base_lab.items()),
+                   key=lambda pair: pair[1])
+
+    def process(self, result: Dict, clusters: List[Dict]):
+        for cluster in clusters:
+            cluster['name'], cluster['delta_e'] = self.nearest_base(cluster['lab'])
+            cluster['delta_e'] = round(cluster['delta_e'], 2)
+        result['dominant_colors'] = clusters
+
+        requested = result.get('components', {}).get('color', "").replace("predominantly ", "", 1)
+        target = self.lab_for(requested) if requested else None
+        if requested and target is None:
+            with self.lock:
+                self.unscored[requested] += 1
+        if target:
+            # Closest significant cluster to the requested color, 1.0 = exact match
+            distance = min(self.delta_e(c['lab'], target) for c in clusters
+                           if c['share'] >= self.MIN_SHARE or c is clusters[0])
+            result['requested_color'] = requested
+            result['color_adherence'] = round(math.exp(-distance / 25), 3)
+
+        shares = defaultdict(float)
+        for cluster in clusters:
+            shares[cluster['name']] += cluster['share']
+        with self.lock:
+            for name, share in shares.items():
+                if share >= self.MIN_SHARE:
+                    self.index[name].append({
+                        'filename': result['filename'],
+                        'ceramic_type': result.get('ceramic_type'),
+                        'share': round(share, 4)
+                    })
+
+    def find(self, color: str, ceramic_type: str = None, min_share: float = 0.2) -> List[Dict]:
+        base = self.base_color(color) or color
+        with self.lock:
+            hits = [hit for hit in self.index.get(base, [])
+                    if hit['share'] >= min_share
+                    and (ceramic_type is None or hit['ceramic_type'] == ceramic_type)]
+        return sorted(hits, key=lambda hit: -hit['share'])
+
+
+class Catalog:
+    """SQLite catalog of every generated image across runs.
+
+    WAL mode keeps readers unblocked while a batch is written; each batch
+    goes in as one transaction. Columns used for lookups are indexed and
+    prompts are searchable through FTS5 where SQLite was built with it.
+    """
+
+    DEFAULT_PATH = Path("logs") / "catalog.db"
+    COLUMNS = ["run_id", "filename", "prompt", "ceramic_type", "category", "color",
+               "aspect_ratio", "dimensions", "seed", "steps", "draft", "rerolls",
+               "generation_seconds", "color_adherence", "near_duplicate_of"]
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY, created TEXT, output_dir TEXT,
+            engine TEXT, steps INTEGER, draft INTEGER, images INTEGER);
+        CREATE TABLE IF NOT EXISTS artifacts (
+            id INTEGER PRIMARY KEY, run_id TEXT REFERENCES runs(run_id),
+            filename TEXT UNIQUE, prompt TEXT, ceramic_type TEXT, category TEXT,
+            color TEXT, aspect_ratio TEXT, dimensions TEXT, seed INTEGER,
+            steps INTEGER, draft INTEGER, rerolls INTEGER, generation_seconds REAL,
+            color_adherence REAL, near_duplicate_of TEXT, metadata TEXT);
+        CREATE INDEX IF NOT EXISTS artifacts_ceramic_type ON artifacts(ceramic_type);
+        CREATE INDEX IF NOT EXISTS artifacts_category ON artifacts(category);
+        CREATE INDEX IF NOT EXISTS artifacts_color ON artifacts(color);
+        CREATE INDEX IF NOT EXISTS artifacts_aspect_ratio ON artifacts(aspect_ratio);
+        CREATE INDEX IF NOT EXISTS artifacts_seed ON artifacts(seed);
+        CREATE INDEX IF NOT EXISTS artifacts_run_id ON artifacts(run_id);
+    """
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS artifacts_fts
+            USING fts5(prompt, content='artifacts', content_rowid='id');
+        CREATE TRIGGER IF NOT EXISTS artifacts_fts_insert AFTER INSERT ON artifacts BEGIN
+            INSERT INTO artifacts_fts(rowid, prompt) VALUES (new.id, new.prompt);
+        END;
+        CREATE TRIGGER IF NOT EXISTS artifacts_fts_delete AFTER DELETE ON artifacts BEGIN
+            INSERT INTO artifacts_fts(artifacts_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+        END;
+        CREATE TRIGGER IF NOT EXISTS artifacts_fts_update AFTER UPDATE ON artifacts BEGIN
+            INSERT INTO artifacts_fts(artifacts_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+            INSERT INTO artifacts_fts(rowid, prompt) VALUES (new.id, new.prompt);
+        END;
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else self.DEFAULT_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        try:
+            self.connection.executescript(self.FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search falls back to LIKE
+            self.fts = False
+
+    def row(self, result: Dict) -> Tuple:
+        values = dict(result)
+        values['color'] = result.get('components', {}).get('color', "").replace("predominantly ", "", 1) or None
+        values['draft'] = int(bool(result.get('draft')))
+        extra = {key: value for key, value in result.items()
+                 if key not in self.COLUMNS and key != 'components'}
+        return tuple(values.get(column) for column in self.COLUMNS) + (
+            json.dumps({'components': result.get('components', {}), **extra}, ensure_ascii=False),)
+
+    def record_run(self, run_id: str, results: List[Dict], output_dir: str = None,
+                   engine: str = None, steps: int = None, draft: bool = False):
+        placeholders = ", ".join("?" * (len(self.COLUMNS) + 1))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, datetime.now().isoformat(timespec='seconds'), output_dir,
+                 engine, steps, int(draft), len(results)))
+            # An upsert, not INSERT OR REPLACE: REPLACE deletes without firing
+            # the delete trigger, which would leave a stale row in the FTS index
+            updates = ", ".join(f"{column} = excluded.{column}"
+                                for column in self.COLUMNS + ["metadata"] if column != "filename")
+            self.connection.executemany(
+                f"INSERT INTO artifacts ({', '.join(self.COLUMNS)}, metadata) "
+                f"VALUES ({placeholders}) ON CONFLICT(filename) DO UPDATE SET {updates}",
+                [self.row(result) for result in results])
+
+    def search(self, text: str = None, limit: int = 50, **filters) -> List[Dict]:
+        """Artifacts matching an FTS query and exact column filters, newest first."""
+        clauses, params = [], []
+        if text and self.fts:
+            clauses.append("id IN (SELECT rowid FROM artifacts_fts WHERE artifacts_fts MATCH ?)")
+            params.append(text)
+        elif text:
+            clauses.append("prompt LIKE ?")
+            params.append(f"%{text}%")
+        for column, value in filters.items():
+            if value is not None:
+                if column not in self.COLUMNS:
+                    raise ValueError(f"Unknown catalog column: {column}")
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM artifacts {where} "
+                f"ORDER BY id DESC LIMIT ?", params + [limit])
+            return [dict(zip(self.COLUMNS, row)) for row in cursor.fetchall()]
+
+    def results(self, run_id: str = None) -> List[Dict]:
+        """Stored results as generate_batch returned them, in insertion order."""
+        where, params = ("WHERE run_id = ?", [run_id]) if run_id else ("", [])
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)}, metadata FROM artifacts {where} ORDER BY id",
+                params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(zip(self.COLUMNS, row[:-1]))
+            result.update(json.loads(row[-1] or "{}"))
+            result['draft'] = bool(result['draft'])
+            results.append(result)
+        return results
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Slots of compose_prompt, one Parquet column each
+PROMPT_SLOTS = ("artifact", "color", "technology", "civilization", "principle", "purpose",
+                "lighting", "camera", "composition", "framing", "description", "material",
+                "style", "quality")
+
+
+def result_status(result: Dict) -> str:
+    # Rows for planned items without an image carry skipped/failed/filtered
+    if result.get('status'):
+        return result['status']
+    if result.get('near_duplicate_of'):
+        return "duplicate"
+    if result.get('rerolls'):
+        return "rerolled"
+    return "draft" if result.get('draft') else "ok"
+
+
+def write_parquet(results: List[Dict], path: Path) -> Path:
+    """Write run results as a zstd Parquet file with dictionary-encoded strings.
+
+    Low-cardinality text (types, slots, colors, aspect ratios) is stored
+    once per row group, so column scans over many runs stay small and fast.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def dimension(result: Dict, axis: int):
+        parts = (result.get('dimensions') or "").split("x")
+        return int(parts[axis]) if len(parts) == 2 else None
+
+    def top_color(result: Dict):
+        clusters = result.get('dominant_colors') or []
+        return clusters[0].get('name') if clusters else None
+
+    strings = {
+        'run_id': [r.get('run_id') for r in results],
+        'ceramic_type': [r.get('ceramic_type') for r in results],
+        'category': [r.get('category') for r in results],
+        'aspect_ratio': [r.get('aspect_ratio') for r in results],
+        'requested_color': [(r.get('components') or {}).get('color', "").replace("predominantly ", "", 1)
+                            or None for r in results],
+        'dominant_color': [top_color(r) for r in results],
+        'status': [result_status(r) for r in results],
+        **{f"prompt_{slot}": [(r.get('components') or {}).get(slot) for r in results]
+           for slot in PROMPT_SLOTS}
+    }
+    columns = {name: pa.array(values, pa.string()).dictionary_encode()
+               for name, values in strings.items()}
+    columns.update({
+        'filename': pa.array([r.get('filename') for r in results], pa.string()),
+        'width': pa.array([dimension(r, 0) for r in results], pa.int32()),
+        'height': pa.array([dimension(r, 1) for r in results], pa.int32()),
+        'seed': pa.array([r.get('seed') for r in results], pa.int64()),
+        'steps': pa.array([r.get('steps') for r in results], pa.int16()),
+        'draft': pa.array([bool(r.get('draft')) for r in results], pa.bool_()),
+        'rerolls': pa.array([r.get('rerolls', 0) for r in results], pa.int16()),
+        'generation_seconds': pa.array([r.get('generation_seconds') for r in results], pa.float64()),
+        'color_adherence': pa.array([r.get('color_adherence') for r in results], pa.float32()),
+        'near_duplicate_of': pa.array([r.get('near_duplicate_of') for r in results], pa.string()),
+        'error': pa.array([r.get('error') for r in results], pa.string())
+    })
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.table(columns), path, compression="zstd", use_dictionary=list(strings))
+    return path
+
+
+def parquet_path(directory: str, run_id: str) -> Path:
+    # One file per run; the directory reads as a single dataset
+    return Path(directory) / f"{run_id}.parquet"
+
+
+class CostModel:
+    """Estimated credits per request by engine, resolution and steps.
+
+    Rates are credits for one image at the reference steps and pixel count;
+    engines marked flat_resolution bill the same for any supported size.
+    ENGINE_RATES are assumed defaults, not a copy of any price sheet; load a
+    JSON file of per-engine overrides (--rates) when the account is billed
+    differently. An override may set just some fields of a known engine.
+    """
+
+    ENGINE_RATES = {
+        "stable-diffusion-xl-1024-v1-0": {"credits": 0.6, "steps": 50, "pixels": 1024 * 1024,
+                                          "flat_resolution": True},
+        "stable-diffusion-v1-6": {"credits": 0.2, "steps": 30, "pixels": 512 * 512,
+                                  "flat_resolution": False},
+        "esrgan-v1-x2plus": {"credits": 0.2, "steps": 1, "pixels": 1024 * 1024,
+                             "flat_resolution": True},
+    }
+    DEFAULT_ENGINE = "stable-diffusion-xl-1024-v1-0"
+    RATE_FIELDS = ("credits", "steps", "pixels", "flat_resolution")
+
+    def __init__(self, rates: Dict[str, Dict] = None):
+        self.rates = {engine: dict(rate) for engine, rate in self.ENGINE_RATES.items()}
+        for engine, override in (rates or {}).items():
+            rate = {**self.rates.get(engine, {}), **override}
+            missing = [field for field in self.RATE_FIELDS if field not in rate]
+            if missing:
+                raise ValueError(f"Rate for {engine} is missing {', '.join(missing)}")
+            self.rates[engine] = rate
+
+    @classmethod
+    def load(cls, path: Path) -> "CostModel":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def estimate(self, engine: str, width: int, height: int, steps: int, samples: int = 1) -> float:
+        rate = self.rates.get(engine, self.rates[self.DEFAULT_ENGINE])
+        credits = rate["credits"] * steps / rate["steps"]
+        if not rate["flat_resolution"]:
+            credits *= (width * height) / rate["pixels"]
+        return credits * samples
+
+
+class Budget:
+    """Hard credit and wall-clock limits shared by every dispatch thread.
+
+    Credits are reserved before a request is sent and refunded if the RPC
+    fails, so concurrent workers can never commit more than the budget between
+    them. A request is only admitted if its predicted latency still ends
+    before the deadline.
+    """
+
+    def __init__(self, credits: float = None, seconds: float = None):
+        self.credits = credits
+        self.deadline = time.time() + seconds if seconds else None
+        self.reserved = 0.0
+        self.lock = threading.Lock()
+
+    def try_reserve(self, cost: float, seconds: float = 0.0) -> bool:
+        with self.lock:
+            if self.deadline is not None and time.time() + seconds > self.deadline:
+                return False
+            if self.credits is not None and self.reserved + cost > self.credits:
+                return False
+            self.reserved += cost
+            return True
+
+    def refund(self, cost: float):
+        with self.lock:
+            self.reserved -= cost
+
+    def available(self) -> float:
+        with self.lock:
+            return None if self.credits is None else self.credits - self.reserved
+
+
+class LatencyEstimator:
+    """Online latency model keyed by engine, size, steps and sampler.
+
+    Keeps an EWMA of the mean plus streaming p50/p95 estimates per key and
+    persists them as JSON between runs. Unseen keys borrow the closest known
+    size for the same engine, scaled by pixel count and steps; with nothing
+    known for the engine the prior is scaled the same way from a 1024x1024,
+    50-step request, so a cold model still ranks jobs by size.
+    """
+
+    DEFAULT_PATH = Path("logs") / "latency_model.json"
+    PRIOR_SECONDS = 10.0
+    PRIOR_PIXELS = 1024 * 1024
+    PRIOR_STEPS = 50
+    QUANTILES = {"p50": 0.5, "p95": 0.95}
+
+    def __init__(self, path: Path = None, alpha: float = 0.2):
+        self.path = Path(path) if path else self.DEFAULT_PATH
+        self.alpha = alpha
+        self.stats: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path = None) -> "LatencyEstimator":
+        estimator = cls(path)
+        if estimator.path.exists():
+            with open(estimator.path) as f:
+                estimator.stats = json.load(f)
+        return estimator
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.stats, indent=2, sort_keys=True)
+        self.path.write_text(data)
+
+    @staticmethod
+    def key(engine: str, width: int, height: int, steps: int, sampler) -> str:
+        return f"{engine}|{width}x{height}|{steps}|{sampler}"
+
+    def observe(self, key: str, seconds: float):
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                self.stats[key] = {"count": 1, "mean": seconds, "dev": 0.0,
+                                   **{name: seconds for name in self.QUANTILES}}
+                return
+            stats["count"] += 1
+            error = seconds - stats["mean"]
+            stats["mean"] += self.alpha * error
+            stats["dev"] += self.alpha * (abs(error) - stats["dev"])
+            # Stochastic-approximation quantiles, step sized to the spread
+            step = self.alpha * max(stats["dev"], 0.05 * stats["mean"], 1e-3)
+            for name, q in self.QUANTILES.items():
+                stats[name] += step * (q - (seconds < stats[name]))
+
+    def predict(self, key: str, stat: str = "mean") -> float:
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is not None:
+                return stats[stat]
+
+            engine, size, steps, sampler = key.split("|")
+            width, height = map(int, size.split("x"))
+            candidates = [(k, v) for k, v in self.stats.items() if k.startswith(engine + "|")]
+            if not candidates:
+                # Every sample in a request is its own diffusion pass
+                samples = int(engine.rpartition("*")[2]) if "*" in engine else 1
+                return (self.PRIOR_SECONDS * (width * height) / self.PRIOR_PIXELS
+                        * int(steps) / self.PRIOR_STEPS * samples)
+
+            def pixels(k: str) -> int:
+                w, h = map(int, k.split("|")[1].split("x"))
+                return w * h
+
+            nearest, stats = min(candidates, key=lambda kv: abs(pixels(kv[0]) - width * height))
+            scale = (width * height) / pixels(nearest) * int(steps) / int(nearest.split("|")[2])
+            return stats[stat] * scale
+
+
+class FilterStats:
+    """Safety-filter hit rates per prompt component, persisted between runs.
+
+    Every attempt counts once for each of its slot values, so components
+    that keep tripping the filter stand out after a few batches.
+    """
+
+    DEFAULT_PATH = Path("logs") / "filter_stats.json"
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else self.DEFAULT_PATH
+        # "slot: text" -> [attempts, filtered]
+        self.counts: Dict[str, List[int]] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path = None) -> "FilterStats":
+        stats = cls(path)
+        if stats.path.exists():
+            with open(stats.path) as f:
+                stats.counts = json.load(f)
+        return stats
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.counts, indent=2, sort_keys=True, ensure_ascii=False)
+        self.path.write_text(data)
+
+    def record(self, components: Dict[str, str], filtered: bool):
+        with self.lock:
+            for slot, text in components.items():
+                counts = self.counts.setdefault(f"{slot}: {text}", [0, 0])
+                counts[0] += 1
+                counts[1] += int(filtered)
+
+    def worst(self, top: int = 10, min_attempts: int = 3) -> List[Tuple[str, float, int]]:
+        with self.lock:
+            rates = [(component, filtered / attempts, attempts)
+                     for component, (attempts, filtered) in self.counts.items()
+                     if filtered and attempts >= min_attempts]
+        return sorted(rates, key=lambda rate: -rate[1])[:top]
+
+
+class DispatchScheduler:
+    """Thread-safe queue of planned items for the dispatch workers.
+
+    "sejf" pops the shortest expected job first with an aging credit of
+    `aging` seconds of priority per second waited. Age counts from when the
+    scheduler started: the planned items all enter at zero, while entries
+    pushed mid-batch enter later and wait behind older work of similar
+    length instead of jumping the queue. Every entry ages at the same rate,
+    so predicted + aging * enqueued_at is a fixed heap key.
+    "fifo" keeps plan order.
+
+    pop() blocks while the queue is empty but popped entries are still
+    running, since they may push more work; it returns None once both are
+    exhausted. Workers call done() after each popped entry.
+    """
+
+    def __init__(self, policy: str = "sejf", aging: float = 0.1):
+        if policy not in ("sejf", "fifo"):
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.aging = aging
+        self.heap = []
+        self.counter = itertools.count()
+        self.started = time.monotonic()
+        self.running = 0
+        self.condition = threading.Condition()
+
+    def push(self, entry, predicted: float):
+        order = next(self.counter)
+        if self.policy == "sejf":
+            key = predicted + self.aging * (time.monotonic() - self.started)
+        else:
+            key = order
+        with self.condition:
+            heapq.heappush(self.heap, (key, order, entry))
+            self.condition.notify()
+
+    def pop(self):
+        with self.condition:
+            while not self.heap:
+                if not self.running:
+                    return None
+                self.condition.wait()
+            self.running += 1
+            return heapq.heappop(self.heap)[2]
+
+    def done(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.heap)
+
+
 class AlienCeramicsGenerator:
-    def __init__(self, colors: List[str]):
-        self.setup_logging()
+    def __init__(self, colors: List[str], console_mode: str = "all", log_sample: int = 10,
+                 metrics: GenerationMetrics = None, tracer: Tracer = None,
+                 host: str = None, budget: Budget = None,
+                 latency: LatencyEstimator = None, timeout_factor: float = None,
+                 upscale: bool = False, local_upscaler: LocalUpscaler = None,
+                 max_rerolls: int = 2, filter_stats: FilterStats = None, samples: int = 1,
+                 duplicates: DuplicateDetector = None, max_duplicates: int = None,
+                 downweight_duplicates: bool = False, color_verifier: ColorVerifier = None,
+                 catalog: Catalog = None, parquet_dir: str = None, pacing: float = 0.5,
+                 cost_model: CostModel = None):
+        self.setup_logging(console_mode, log_sample)
+        self.metrics = metrics or GenerationMetrics()
+        self.tracer = tracer or Tracer()
+        # Set on authentication failure; stops every batch sharing this client
+        self.stop_dispatch = threading.Event()
+        self.engine = "stable-diffusion-xl-1024-v1-0"
+        self.steps = 50
+        self.cfg_scale = 7.5
+        self.sampler = generation.SAMPLER_K_DPMPP_2M
+        # Images per request; every plan item yields this many
+        self.samples = samples
+        # Drafts: a quick preview pass whose keepers are re-rendered at full quality
+        self.draft_steps = 10
+        self.draft_scale = 0.5
+        # Final renders can be chained into a server-side upscaler in the same RPC
+        self.upscale = upscale
+        self.upscale_engine = "esrgan-v1-x2plus"
+        self.upscale_factor = 2
+        self.local_upscaler = local_upscaler
+        # Filtered (blurred) results are dropped and retried with a fresh seed
+        self.max_rerolls = max_rerolls
+        self.filter_stats = filter_stats or FilterStats.load()
+        # Near-duplicate detection; enough hits stop dispatch early
+        self.duplicates = duplicates
+        self.max_duplicates = max_duplicates
+        self.duplicate_count = 0
+        # record_duplicate runs on analysis callback threads
+        self.duplicate_lock = threading.Lock()
+        self.downweight_duplicates = downweight_duplicates
+        # "slot: text" -> sampling weight, lowered for duplicate-prone components
+        self.component_weights: Dict[str, float] = {}
+        if duplicates:
+            duplicates.on_duplicate = self.record_duplicate
+        self.color_verifier = color_verifier
+        self.catalog = catalog
+        self.parquet_dir = parquet_dir
+        stages = [stage for stage in (duplicates, color_verifier) if stage]
+        self.analyzer = ImageAnalyzer(stages) if stages else None
+        if self.analyzer:
+            atexit.register(self.analyzer.shutdown)
+        self.capabilities = EngineCapabilities(self.engine)
+        self.validate_request_settings()
+        self.budget = budget or Budget()
+        self.cost_model = cost_model or CostModel()
+        self.latency = latency or LatencyEstimator.load()
+        self.timeout_factor = timeout_factor
+        # Pause after each successful request, in seconds; 0 disables it
+        self.pacing = pacing
+        self.aging = 0.1
+        self.eta_lock = threading.Lock()
         self.logger.info(
             f"{EMOJIS['start']} Initializing Alien Ceramics Generator")
 
@@ -252,11 +1976,16 @@ class AlienCeramicsGenerator:
             self.logger.error(f"{EMOJIS['error']} No API key found")
             raise ValueError("No API key found. Please set STABILITY_API_KEY")
 
+        # STABILITY_HOST / --host point the client at e.g. fake_stability_server.py
+        self.host = host or os.getenv('STABILITY_HOST', 'grpc.stability.ai:443')
+
         try:
             self.stability_api = client.StabilityInference(
+                host=self.host,
                 key=self.api_key,
                 verbose=True,
-                engine="stable-diffusion-xl-1024-v1-0",  # important
+                engine=self.engine,  # important
+                upscale_engine=self.upscale_engine
             )
             self.logger.info(f"{EMOJIS['api']} API connection established")
         except Exception as e:
@@ -460,38 +2189,57 @@ class AlienCeramicsGenerator:
         #     "against conservation-grade backdrop"
         # ]
 
-    def setup_logging(self):
-        log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = log_dir / f"ceramic_generation_{timestamp}.log"
-
-        self.logger = logging.getLogger("AlienCeramics")
-        self.logger.setLevel(logging.INFO)
-
-        file_handler = logging.FileHandler(log_file)
-        console_handler = logging.StreamHandler()
-
-        file_formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s')
-        console_formatter = logging.Formatter('%(message)s')
-
-        file_handler.setFormatter(file_formatter)
-        console_handler.setFormatter(console_formatter)
-
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+    def setup_logging(self, console_mode: str = "all", sample_every: int = 10):
+        self.logger = setup_logging(console_mode, sample_every)
 
     def get_random_aspect_ratio(self) -> AspectRatio:
         return random.choice(list(AspectRatio))
 
-    def generate_prompt(self, aspect_ratio: AspectRatio) -> str:
+    def plan_batch(self,
+                   num_images: int,
+                   type_weights: Dict[CeramicType, float] = None,
+                   category_weights: Dict[str, float] = None,
+                   aspect_weights: Dict[AspectRatio, float] = None) -> List[Dict]:
+        planner = BatchPlanner(list(self.ceramic_classifications.keys()),
+                               type_weights, category_weights, aspect_weights)
+        return planner.plan(num_images)
+
+    def choose(self, slot: str, options: List[str]) -> str:
+        if not self.component_weights:
+            return random.choice(options)
+        weights = [self.component_weights.get(f"{slot}: {option}", 1.0) for option in options]
+        return random.choices(options, weights)[0]
+
+    def record_duplicate(self, result: Dict, match: Dict):
+        self.logger.warning(
+            f"{EMOJIS['warning']} {Path(result['filename']).name} is a near-duplicate of "
+            f"{match['filename']} ({result['duplicate_scope']})")
+        with self.duplicate_lock:
+            self.duplicate_count += 1
+            count = self.duplicate_count
+            if self.downweight_duplicates:
+                for slot, text in result.get('components', {}).items():
+                    key = f"{slot}: {text}"
+                    self.component_weights[key] = self.component_weights.get(key, 1.0) * 0.5
+        if self.max_duplicates and count >= self.max_duplicates:
+            if not self.stop_dispatch.is_set():
+                self.logger.warning(
+                    f"{EMOJIS['warning']} {count} near-duplicates, stopping dispatch")
+            self.stop_dispatch.set()
+
+    def generate_prompt(self, aspect_ratio: AspectRatio, category: str = None,
+                        ceramic_type: CeramicType = None, colors: List[str] = None) -> str:
+        return ", ".join(self.compose_prompt(aspect_ratio, category, ceramic_type, colors).values())
+
+    def compose_prompt(self, aspect_ratio: AspectRatio, category: str = None,
+                       ceramic_type: CeramicType = None, colors: List[str] = None) -> Dict[str, str]:
+        """Prompt components keyed by slot, in prompt order."""
         # chosen_color = self.color_manager.get_next_color()
         # self.logger.info(f"{EMOJIS['color']} Selected color: {chosen_color}")
 
         # Select random categories
-        category = random.choice(list(self.ceramic_classifications.keys()))
+        if category is None:
+            category = random.choice(list(self.ceramic_classifications.keys()))
         if category == "Cosmic Scale":
             scale = random.choice(
                 list(self.ceramic_classifications["Cosmic Scale"].keys()))
@@ -509,30 +2257,32 @@ class AlienCeramicsGenerator:
         }
 
         # Get color description
-        if self.colors:
-            color_desc = f"predominantly {random.choice(self.colors)}"
+        if colors is None:
+            colors = self.colors
+        if colors:
+            color_desc = f"predominantly {random.choice(colors)}"
         else:
-            colors, weights, _ = get_random_colors()
+            colors, weights, _ = get_random_colors(ceramic_type)
             color_desc = f"predominantly {colors[0]}"
 
-        components = [
-            f"Advanced alien ceramic artifact: {base_desc}",
-            color_desc,
-            random.choice(self.technological_aspects),
-            random.choice(self.alien_civilizations),
-            random.choice(self.scientific_principles),
-            random.choice(self.cosmic_purposes),
-            random.choice(self.lighting),
-            random.choice(self.camera_settings),
-            random.choice(self.composition_settings),
-            # random.choice(self.backgrounds),
-            composition_hints[aspect_ratio],
-            random.choice(self.base_descriptions),
-            random.choice(self.materials),
-            random.choice(self.styles),
-            "professional museum photography, sharp focus, high detail, proper exposure, full framing, uniform lighting, clear edges, 8k, highly detailed, professional color accuracy"
-            # "professional product photography, studio lighting, 8k, highly detailed"
-        ]
+        components = {
+            'artifact': f"Advanced alien ceramic artifact: {base_desc}",
+            'color': color_desc,
+            'technology': self.choose('technology', self.technological_aspects),
+            'civilization': self.choose('civilization', self.alien_civilizations),
+            'principle': self.choose('principle', self.scientific_principles),
+            'purpose': self.choose('purpose', self.cosmic_purposes),
+            'lighting': self.choose('lighting', self.lighting),
+            'camera': self.choose('camera', self.camera_settings),
+            'composition': self.choose('composition', self.composition_settings),
+            # 'background': random.choice(self.backgrounds),
+            'framing': composition_hints[aspect_ratio],
+            'description': self.choose('description', self.base_descriptions),
+            'material': self.choose('material', self.materials),
+            'style': self.choose('style', self.styles),
+            'quality': "professional museum photography, sharp focus, high detail, proper exposure, full framing, uniform lighting, clear edges, 8k, highly detailed, professional color accuracy"
+            # 'quality': "professional product photography, studio lighting, 8k, highly detailed"
+        }
         # Log the cosmic classification for this generation
         self.logger.info(
             f"{EMOJIS['alien']} Cosmic Classification: {category}")
@@ -540,97 +2290,737 @@ class AlienCeramicsGenerator:
             self.logger.info(f"{EMOJIS['info']} Scale Category: {scale}")
 
         # return ", ".join(components), chosen_color
-        return ", ".join(components)
+        return components
 
     def generate_batch(self,
                        num_images: int,
                        output_dir: str = "alien_ceramics",
-                       seed: int = None) -> List[Dict]:
+                       seed: int = None,
+                       plan: List[Dict] = None,
+                       concurrency: int = 1,
+                       schedule: str = "sejf",
+                       draft: bool = False) -> List[Dict]:
+        if plan is None:
+            plan = self.plan_batch(num_images)
+        plan = self.trim_to_budget(plan, draft)
+        num_images = len(plan)
+        run_id = f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+
         self.logger.info(
-            f"\n{EMOJIS['batch']} Starting batch generation of {num_images} images")
+            f"\n{EMOJIS['batch']} Starting {'draft ' if draft else ''}batch generation of {num_images} images")
 
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         self.logger.info(f"{EMOJIS['info']} Output directory: {output_path}")
 
-        generated_images = []
-
-        for i in range(num_images):
-            aspect_ratio = self.get_random_aspect_ratio()
-            prompt = self.generate_prompt(aspect_ratio)
+        strata = {(item['ceramic_type'], item['category'], item['aspect_ratio'])
+                  for item in plan}
+        self.logger.info(
+            f"{EMOJIS['config']} Plan covers {len(strata)} type/category/aspect strata")
+        self.logger.info(
+            f"{EMOJIS['info']} Estimated cost: {self.estimate_cost(plan, draft):.2f} credits")
 
-            try:
+        concurrency = max(1, concurrency)
+        predicted = [self.latency.predict(
+            self.latency_key(item['aspect_ratio'], draft, item.get('samples'))) + self.pacing
+            for item in plan]
+        remaining = {'seconds': sum(predicted), 'images': num_images}
+        self.logger.info(
+            f"{EMOJIS['time']} Estimated duration: {format_duration(remaining['seconds'] / concurrency)}")
+
+        timeout = None
+        if self.timeout_factor:
+            # Deadline for every request: the slowest planned size's p95, scaled.
+            # Passed per call, the client's grpc_args stay shared and untouched
+            slowest = max(self.latency.predict(
+                self.latency_key(item['aspect_ratio'], draft, item.get('samples')), "p95")
+                for item in plan)
+            timeout = slowest * self.timeout_factor
+            self.logger.info(
+                f"{EMOJIS['config']} Request timeout: {timeout:.1f}s")
+
+        scheduler = DispatchScheduler(schedule, self.aging)
+
+        def requeue(i: int, item: Dict):
+            expected = self.latency.predict(
+                self.latency_key(item['aspect_ratio'], draft, item.get('samples'))) + self.pacing
+            with self.eta_lock:
+                remaining['seconds'] += expected
+            scheduler.push((i, item, expected), expected)
+
+        # Plan index -> why the item ended without an image
+        outcomes: Dict[int, Dict] = {}
+
+        def dispatch(entry: Tuple[int, Dict, float]) -> List[Dict]:
+            i, item, expected = entry
+            stopped = self.stop_dispatch.is_set()
+            if stopped:
+                outcomes.setdefault(i, {'status': "skipped", 'error': "dispatch stopped"})
+                results = []
+            else:
+                results = self.generate_item(i, item, num_images, output_path, seed, draft,
+                                             item.get('attempt', 0), timeout, requeue, outcomes)
+            # Skipped items leave the estimate too, or the ETA never reaches zero
+            with self.eta_lock:
+                remaining['seconds'] -= expected
+                if not item.get('attempt'):
+                    remaining['images'] -= 1
+                eta = remaining['seconds'] / concurrency
+            if remaining['images'] and not stopped:
                 self.logger.info(
-                    f"\n{EMOJIS['generate']} Generating image {i+1}/{num_images}")
+                    f"{EMOJIS['time']} ETA: {format_duration(eta)} for {remaining['images']} remaining")
+            return results
+
+        for i, item in enumerate(plan):
+            scheduler.push((i, item, predicted[i]), predicted[i])
+        results_by_index: Dict[int, List[Dict]] = defaultdict(list)
+
+        def worker():
+            while True:
+                entry = scheduler.pop()
+                if entry is None:
+                    return
+                try:
+                    results_by_index[entry[0]].extend(dispatch(entry))
+                finally:
+                    scheduler.done()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(concurrency)]:
+                future.result()
+
+        # Results come back in plan order whatever the dispatch order
+        generated_images = [result for i in sorted(results_by_index)
+                            for result in results_by_index[i]]
+
+        if self.analyzer:
+            with self.tracer.span("analysis_drain"):
+                self.analyzer.drain()
+        if self.duplicates:
+            flagged = sum(1 for result in generated_images if result.get('near_duplicate_of'))
+            self.logger.info(
+                f"{EMOJIS['info']} {flagged} near-duplicates flagged in this batch")
+        if self.color_verifier:
+            scores = [result['color_adherence'] for result in generated_images
+                      if 'color_adherence' in result]
+            if scores:
                 self.logger.info(
-                    f"{EMOJIS['aspect']} Aspect Ratio: {aspect_ratio.ratio_name}")
+                    f"{EMOJIS['color']} Mean color adherence: {sum(scores) / len(scores):.2f}")
+            unscored = self.color_verifier.take_unscored()
+            if unscored:
+                self.logger.warning(
+                    f"{EMOJIS['warning']} {sum(unscored.values())} images not color-scored, "
+                    f"no known base hue in: {', '.join(sorted(unscored))}")
+
+        if self.local_upscaler:
+            with self.tracer.span("local_upscale_drain"):
+                upscaled = self.local_upscaler.drain()
+            self.logger.info(
+                f"{EMOJIS['dim']} Upscaled {upscaled} images locally x{self.local_upscaler.factor}")
+
+        for result in generated_images:
+            result['run_id'] = run_id
+        if self.catalog:
+            with self.tracer.span("catalog_write"):
+                self.catalog.record_run(run_id, generated_images, output_dir, self.engine,
+                                        self.request_steps(draft), draft)
+            self.logger.info(
+                f"{EMOJIS['save']} Cataloged {len(generated_images)} images as run {run_id}")
+        if self.parquet_dir and plan:
+            # One row per image, plus one per planned item that produced none
+            rows = []
+            for i, item in enumerate(plan):
+                if results_by_index.get(i):
+                    rows.extend(results_by_index[i])
+                    continue
+                output_width, output_height = self.output_size(item['aspect_ratio'], draft)
+                rows.append({
+                    'run_id': run_id,
+                    'prompt': item.get('prompt'),
+                    'components': item.get('components', {}),
+                    'seed': item.get('seed'),
+                    **outcomes.get(i, {'status': "skipped"}),
+                    'aspect_ratio': item['aspect_ratio'].ratio_name,
+                    'ceramic_type': item['ceramic_type'].value,
+                    'category': item['category'],
+                    'dimensions': f"{output_width}x{output_height}",
+                    'steps': self.request_steps(draft),
+                    'draft': draft
+                })
+            with self.tracer.span("parquet_write"):
+                manifest_file = write_parquet(rows, parquet_path(self.parquet_dir, run_id))
+            self.logger.info(f"{EMOJIS['save']} Parquet manifest: {manifest_file}")
+
+        self.latency.save()
+        self.filter_stats.save()
+        if self.metrics.status_counts.get("FILTERED"):
+            self.logger.info(f"{EMOJIS['info']} Prompt components most often filtered:")
+            for component, rate, attempts in self.filter_stats.worst(5):
+                self.logger.info(f"  {rate:.0%} of {attempts}: {component}")
+        return generated_images
+
+    def validate_request_settings(self):
+        if not self.capabilities.known:
+            self.logger.warning(
+                f"{EMOJIS['warning']} No capability table for {self.engine}, sizes are sent unchanged")
+            return
+        steps = self.capabilities.clamp_steps(self.steps)
+        if steps != self.steps:
+            self.logger.warning(
+                f"{EMOJIS['warning']} {self.engine} takes {self.capabilities.spec['steps']} steps, using {steps}")
+            self.steps = steps
+        self.draft_steps = self.capabilities.clamp_steps(self.draft_steps)
+        if not self.capabilities.supports_sampler(self.sampler):
+            self.logger.warning(
+                f"{EMOJIS['warning']} Sampler {self.sampler} not supported by {self.engine}, using K_DPMPP_2M")
+            self.sampler = generation.SAMPLER_K_DPMPP_2M
+        for aspect_ratio in AspectRatio:
+            width, height = self.request_size(aspect_ratio)
+            if (width, height) != (aspect_ratio.width, aspect_ratio.height):
                 self.logger.info(
-                    f"{EMOJIS['dim']} Dimensions: {aspect_ratio.width}x{aspect_ratio.height}")
-                self.logger.info(f"{EMOJIS['prompt']} Prompt: {prompt}")
-
-                generation_start = time.time()
-
-                answers = self.stability_api.generate(
-                    prompt=prompt,
-                    seed=seed if seed else random.randint(0, 1000000),
-                    # steps=40,
-                    # cfg_scale=8.0,
-                    steps=50,
-                    cfg_scale=7.5,
-                    width=aspect_ratio.width,
-                    height=aspect_ratio.height,
-                    samples=1,
-                    sampler=generation.SAMPLER_K_DPMPP_2M
-                )
+                    f"{EMOJIS['dim']} {aspect_ratio.ratio_name} {aspect_ratio.width}x{aspect_ratio.height} "
+                    f"snapped to {width}x{height} for {self.engine}")
+
+    def request_size(self, aspect_ratio: AspectRatio, draft: bool = False) -> Tuple[int, int]:
+        width, height = self.capabilities.snap(aspect_ratio.width, aspect_ratio.height)
+        if draft and self.draft_scale < 1:
+            # Fixed-size engines snap straight back, so only grid engines shrink
+            width, height = self.capabilities.snap(int(width * self.draft_scale),
+                                                   int(height * self.draft_scale))
+        return width, height
+
+    def request_steps(self, draft: bool = False) -> int:
+        return self.draft_steps if draft else self.steps
+
+    def chains_upscale(self, draft: bool = False) -> bool:
+        # Drafts are only previews, never worth upscaling
+        return self.upscale and not draft
+
+    def output_size(self, aspect_ratio: AspectRatio, draft: bool = False) -> Tuple[int, int]:
+        width, height = self.request_size(aspect_ratio, draft)
+        if self.chains_upscale(draft):
+            return width * self.upscale_factor, height * self.upscale_factor
+        return width, height
+
+    def request_cost(self, aspect_ratio: AspectRatio, draft: bool = False,
+                     samples: int = None) -> float:
+        samples = samples or self.samples
+        cost = self.cost_model.estimate(self.engine, *self.request_size(aspect_ratio, draft),
+                                        self.request_steps(draft), samples)
+        if self.chains_upscale(draft):
+            cost += self.cost_model.estimate(self.upscale_engine, *self.output_size(aspect_ratio),
+                                             1, samples)
+        return cost
+
+    def latency_key(self, aspect_ratio: AspectRatio, draft: bool = False,
+                    samples: int = None) -> str:
+        engine = self.engine
+        if self.chains_upscale(draft):
+            engine = f"{self.engine}+{self.upscale_engine}"
+        samples = samples or self.samples
+        if samples > 1:
+            engine = f"{engine}*{samples}"
+        return LatencyEstimator.key(engine, *self.request_size(aspect_ratio, draft),
+                                    self.request_steps(draft), self.sampler)
+
+    def estimate_duration(self, plan: List[Dict], concurrency: int = 1, draft: bool = False) -> float:
+        # Each request is followed by the pacing pause in generate_item
+        total = sum(self.latency.predict(
+            self.latency_key(item['aspect_ratio'], draft, item.get('samples'))) + self.pacing
+            for item in plan)
+        return total / max(1, concurrency)
+
+    def estimate_cost(self, plan: List[Dict], draft: bool = False) -> float:
+        return sum(self.request_cost(item['aspect_ratio'], draft, item.get('samples'))
+                   for item in plan)
+
+    def chain_generate_upscale(self, prompt: str, seed: int, steps: int,
+                               width: int, height: int, samples: int = 1,
+                               timeout: float = None):
+        """Generate and upscale in one ChainGenerate RPC.
+
+        The generate stage passes its image straight to the upscaler stage
+        on the server, and only the upscaled artifact is returned.
+        """
+        generate_request = self.generation_request(prompt, seed, steps, width, height, samples)
+        upscale_request = generation.Request(
+            engine_id=self.upscale_engine,
+            request_id=str(uuid.uuid4()),
+            image=generation.ImageParameters(
+                width=width * self.upscale_factor,
+                height=height * self.upscale_factor
+            )
+        )
+        chain = generation.ChainRequest(
+            request_id=str(uuid.uuid4()),
+            stage=[
+                generation.Stage(id="generate", request=generate_request, on_status=[
+                    generation.OnStatus(action=[generation.STAGE_ACTION_PASS], target="upscale")]),
+                generation.Stage(id="upscale", request=upscale_request, on_status=[
+                    generation.OnStatus(action=[generation.STAGE_ACTION_RETURN])])
+            ]
+        )
+        return self.stability_api.stub.ChainGenerate(chain, **self.rpc_options(timeout))
+
+    def trim_to_budget(self, plan: List[Dict], draft: bool = False) -> List[Dict]:
+        """Drops the tail of a plan the credit budget can't pay for, before any RPC."""
+        available = self.budget.available()
+        if available is None:
+            return plan
+        total = 0.0
+        for count, item in enumerate(plan):
+            total += self.request_cost(item['aspect_ratio'], draft, item.get('samples'))
+            if total > available + 1e-9:
+                self.logger.warning(
+                    f"{EMOJIS['warning']} Plan needs {self.estimate_cost(plan, draft):.2f} credits, "
+                    f"{available:.2f} left in the budget: trimming to {count}/{len(plan)} images")
+                return plan[:count]
+        return plan
+
+    def rpc_options(self, timeout: float = None) -> Dict:
+        if timeout is None:
+            return self.stability_api.grpc_args
+        return dict(self.stability_api.grpc_args, timeout=timeout)
+
+    def generation_request(self, prompt: str, seed: int, steps: int,
+                           width: int, height: int, samples: int = 1) -> generation.Request:
+        return generation.Request(
+            engine_id=self.engine,
+            request_id=str(uuid.uuid4()),
+            prompt=[generation.Prompt(text=prompt)],
+            image=generation.ImageParameters(
+                transform=generation.TransformType(diffusion=self.sampler),
+                width=width,
+                height=height,
+                seed=[seed],
+                steps=steps,
+                samples=samples,
+                parameters=[generation.StepParameter(
+                    scaled_step=0,
+                    sampler=generation.SamplerParameters(cfg_scale=self.cfg_scale))]
+            )
+        )
+
+    def generate_item(self, i: int, item: Dict, num_images: int,
+                      output_path: Path, seed: int = None, draft: bool = False,
+                      attempt: int = 0, timeout: float = None,
+                      requeue: Callable[[int, Dict], None] = None,
+                      outcomes: Dict[int, Dict] = None) -> List[Dict]:
+        """Render one plan item; returns the images written.
+
+        Items that end without an image leave their status (skipped, failed
+        or filtered) and the request they would have made in outcomes[i].
+        """
+        generated_images = []
+        filtered = 0
+        aspect_ratio = item['aspect_ratio']
+        samples = item.get('samples', self.samples)
+        # Re-rolls continue the file numbering of the attempt they replace
+        image_offset = item.get('image_offset', 0)
+
+        width, height = self.request_size(aspect_ratio, draft)
+        output_width, output_height = self.output_size(aspect_ratio, draft)
+        steps = self.request_steps(draft)
+        cost = self.request_cost(aspect_ratio, draft, samples)
+        latency_key = self.latency_key(aspect_ratio, draft, samples)
+        expected_seconds = self.latency.predict(latency_key)
+        with self.tracer.span("prompt_build", lane=i):
+            # Refined and re-rolled items reuse their prompt verbatim
+            if item.get('prompt'):
+                prompt, components = item['prompt'], item.get('components', {})
+            else:
+                components = self.compose_prompt(
+                    aspect_ratio, item['category'], item['ceramic_type'], item.get('colors'))
+                prompt = ", ".join(components.values())
+        # Seed 0 is a valid seed, only a missing one is drawn at random
+        request_seed = item.get('seed')
+        if request_seed is None:
+            request_seed = seed if seed is not None else random.randint(0, 1000000)
+
+        def record_outcome(status: str, error: str = None):
+            if outcomes is not None:
+                outcomes[i] = {'status': status, 'error': error, 'prompt': prompt,
+                               'components': components, 'seed': request_seed,
+                               'rerolls': attempt}
+
+        if not self.budget.try_reserve(cost, expected_seconds):
+            if not self.stop_dispatch.is_set():
+                self.logger.warning(
+                    f"{EMOJIS['warning']} Budget exhausted, stopping dispatch at image {i+1}")
+            self.stop_dispatch.set()
+            record_outcome("skipped", "budget exhausted")
+            return generated_images
+        # Set once the server answers: the generation ran and was charged, so
+        # a later local failure must not hand the credits back
+        billed = False
+        streaming = False
+
+        try:
+            self.logger.info(
+                f"\n{EMOJIS['generate']} Generating image {i+1}/{num_images}")
+            self.logger.info(
+                f"{EMOJIS['aspect']} Aspect Ratio: {aspect_ratio.ratio_name}")
+            self.logger.info(
+                f"{EMOJIS['dim']} Dimensions: {output_width}x{output_height}")
+            self.logger.info(f"{EMOJIS['prompt']} Prompt: {prompt}")
+
+            generation_start = time.time()
+            span_start = time.perf_counter()
+            self.metrics.add_in_flight(1)
+            streaming = True
+
+            # Both calls return a lazy stream; the RPC runs while the answer
+            # stream is drained below
+            if self.chains_upscale(draft):
+                answers = self.chain_generate_upscale(prompt, request_seed, steps,
+                                                      width, height, samples, timeout)
+            else:
+                answers = self.stability_api.stub.Generate(
+                    self.generation_request(prompt, request_seed, steps, width, height, samples),
+                    **self.rpc_options(timeout))
+            self.tracer.record("rpc_start", span_start, time.perf_counter(), lane=i)
+
+            extra_artifacts = []
+            for j, answer in enumerate(answers):
+                if j == 0:
+                    billed = True
+                    self.tracer.record("first_artifact", span_start, time.perf_counter(), lane=i)
                 generation_time = time.time() - generation_start
 
-                for j, answer in enumerate(answers):
+                # An answer may carry several artifacts, and not all of them images
+                for artifact in answer.artifacts:
+                    if artifact.type != generation.ARTIFACT_IMAGE:
+                        extra_artifacts.append({
+                            'type': generation.ArtifactType.Name(artifact.type),
+                            'index': artifact.index,
+                            'text': artifact.text
+                        })
+                        continue
+                    is_filtered = artifact.finish_reason == generation.FILTER
+                    self.filter_stats.record(components, is_filtered)
+                    if is_filtered:
+                        # The safety filter returns a blurred image; never write it
+                        filtered += 1
+                        continue
+
                     filename = output_path / \
-                        f"ceramic_{i}_{aspect_ratio.ratio_name.replace(':', '_')}_{j}.png"
-                    with open(filename, 'wb') as f:
-                        f.write(answer.artifacts[0].binary)
-
-                    generated_images.append({
-                        'filename': str(filename),
-                        'prompt': prompt,
-                        'aspect_ratio': aspect_ratio.ratio_name,
-                        'dimensions': f"{aspect_ratio.width}x{aspect_ratio.height}",
-                        'seed': seed if seed else None,
-                        'generation_time': f"{generation_time:.2f}s"
-                    })
+                        f"ceramic_{i}_{aspect_ratio.ratio_name.replace(':', '_')}_{image_offset + len(generated_images)}.png"
+                    with self.tracer.span("write", lane=i, file=filename.name):
+                        write_image(filename, artifact.binary)
+                    self.metrics.record_image(len(artifact.binary))
+
+                    with self.tracer.span("manifest_append", lane=i):
+                        result = {
+                            'filename': str(filename),
+                            'prompt': prompt,
+                            'components': components,
+                            'aspect_ratio': aspect_ratio.ratio_name,
+                            'ceramic_type': item['ceramic_type'].value,
+                            'category': item['category'],
+                            'dimensions': f"{output_width}x{output_height}",
+                            # Samples past the first are seeded seed+index server-side
+                            'seed': artifact.seed or request_seed,
+                            'artifact_id': artifact.id,
+                            'artifact_index': artifact.index,
+                            'mime': artifact.mime,
+                            'steps': steps,
+                            'draft': draft,
+                            'rerolls': attempt,
+                            'generation_time': f"{generation_time:.2f}s",
+                            'generation_seconds': generation_time
+                        }
+                        generated_images.append(result)
+                    if self.local_upscaler and not draft:
+                        self.local_upscaler.submit(result)
+                    if self.analyzer:
+                        self.analyzer.submit(result)
 
                     self.logger.info(
                         f"{EMOJIS['save']} Saved image to: {filename}")
                     self.logger.info(
                         f"{EMOJIS['time']} Generation time: {generation_time:.2f}s")
 
+            if extra_artifacts:
+                self.logger.info(
+                    f"{EMOJIS['info']} {len(extra_artifacts)} non-image artifacts: "
+                    f"{', '.join(sorted({a['type'] for a in extra_artifacts}))}")
+                for result in generated_images:
+                    result['extra_artifacts'] = extra_artifacts
+
+            self.tracer.record("stream_complete", span_start, time.perf_counter(),
+                               lane=i, aspect_ratio=aspect_ratio.ratio_name)
+
+            elapsed = time.time() - generation_start
+            streaming = False
+            self.metrics.add_in_flight(-1)
+            self.metrics.record_status("FILTERED" if filtered else "OK")
+            self.metrics.observe_latency(aspect_ratio.ratio_name, self.engine, elapsed)
+            self.latency.observe(latency_key, elapsed)
+
+            if filtered:
+                self.logger.warning(
+                    f"{EMOJIS['warning']} {filtered}/{samples} of image {i+1} caught by the safety filter "
+                    f"(seed {request_seed})")
+            else:
                 self.logger.info(
                     f"{EMOJIS['success']} Successfully generated image {i+1}")
-                time.sleep(0.5)
-
-            except grpc.RpcError as e:
-                if e.code() == grpc.StatusCode.UNAUTHENTICATED:
-                    self.logger.error(
-                        f"{EMOJIS['error']} Authentication failed")
-                    break
-                elif e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
-                    self.logger.warning(
-                        f"{EMOJIS['warning']} Rate limit reached. Waiting...")
-                    time.sleep(5)
-                    continue
-                else:
-                    self.logger.error(
-                        f"{EMOJIS['error']} Error generating image {i+1}: {str(e)}")
-                    continue
-            except Exception as e:
+            if self.pacing:
+                time.sleep(self.pacing)
+
+        except grpc.RpcError as e:
+            if streaming:
+                self.metrics.add_in_flight(-1)
+            self.metrics.record_status(e.code().name)
+            if not billed:
+                self.budget.refund(cost)
+            record_outcome("failed", e.code().name)
+            if e.code() == grpc.StatusCode.UNAUTHENTICATED:
                 self.logger.error(
-                    f"{EMOJIS['error']} Unexpected error: {str(e)}")
-                continue
-
+                    f"{EMOJIS['error']} Authentication failed")
+                self.stop_dispatch.set()
+                return generated_images
+            elif e.code() == grpc.StatusCode.PERMISSION_DENIED:
+                self.logger.error(
+                    f"{EMOJIS['error']} Permission denied (credits exhausted?), stopping dispatch")
+                self.stop_dispatch.set()
+                return generated_images
+            elif e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                self.logger.warning(
+                    f"{EMOJIS['warning']} Rate limit reached. Waiting...")
+                time.sleep(5)
+                return generated_images
+            elif e.code() == grpc.StatusCode.DEADLINE_EXCEEDED and timeout:
+                # The request took at least this long; without the observation
+                # the model only ever learns from fast requests and keeps tightening
+                self.latency.observe(latency_key, timeout)
+                self.logger.error(
+                    f"{EMOJIS['error']} Image {i+1} timed out after {timeout:.1f}s")
+                return generated_images
+            else:
+                self.logger.error(
+                    f"{EMOJIS['error']} Error generating image {i+1}: {str(e)}")
+                return generated_images
+        except Exception as e:
+            if streaming:
+                self.metrics.add_in_flight(-1)
+            self.metrics.record_status("UNKNOWN")
+            if not billed:
+                self.budget.refund(cost)
+            record_outcome("failed", str(e))
+            self.logger.error(
+                f"{EMOJIS['error']} Unexpected error: {str(e)}")
+            return generated_images
+
+        if filtered and attempt < self.max_rerolls and not self.stop_dispatch.is_set():
+            self.logger.info(
+                f"{EMOJIS['generate']} Re-rolling image {i+1} with a new seed "
+                f"({attempt+1}/{self.max_rerolls})")
+            # Only the filtered samples are requested again
+            rerolled = dict(item, prompt=prompt, components=components, samples=filtered,
+                            image_offset=image_offset + len(generated_images),
+                            seed=random.randint(0, 1000000), attempt=attempt + 1)
+            if requeue:
+                # Back through the scheduler, so the re-roll ages from now
+                requeue(i, rerolled)
+                return generated_images
+            return generated_images + self.generate_item(
+                i, rerolled, num_images, output_path, None, draft, attempt + 1, timeout,
+                outcomes=outcomes)
+
+        if filtered:
+            record_outcome("filtered")
         return generated_images
 
+    def run_suite(self,
+                  jobs: List[Dict],
+                  output_dir: str = "alien_ceramics_suite",
+                  workers: int = 1,
+                  concurrency: int = 1,
+                  schedule: str = "sejf") -> Dict:
+        self.logger.info(
+            f"\n{EMOJIS['batch']} Running suite of {len(jobs)} presets with {workers} worker(s)")
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
 
-def main():
+        color_index = ColorIndex.build()
+
+        def run_job(job: Dict) -> Dict:
+            type_weights = {job['type']: 1.0} if job['type'] else None
+            if type_weights is None and job['colors']:
+                type_weights = color_index.infer_type_weights(job['colors']) or None
+            plan = self.plan_batch(job['num_images'], type_weights=type_weights)
+            for item in plan:
+                item['colors'] = job['colors']
+            results = self.generate_batch(
+                num_images=job['num_images'],
+                output_dir=str(output_path / job['slug']),
+                plan=plan,
+                concurrency=concurrency,
+                schedule=schedule
+            )
+            return {
+                'name': job['name'],
+                'source': job['source'],
+                'colors': job['colors'],
+                'type': job['type'].value if job['type'] else None,
+                'output_dir': str(output_path / job['slug']),
+                'results': results
+            }
+
+        # The stability client and its gRPC channel are shared by every preset
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            presets = list(pool.map(run_job, jobs))
+
+        manifest = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'presets': presets,
+            'total_images': sum(len(p['results']) for p in presets)
+        }
+        manifest_file = output_path / "suite_manifest.json"
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        self.logger.info(
+            f"{EMOJIS['save']} Suite manifest written to: {manifest_file}")
+        return manifest
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def slugify(name: str) -> str:
+    return "-".join("".join(c if c.isalnum() else " " for c in name.lower()).split())
+
+
+def load_suite(paths: List[str], parser: argparse.ArgumentParser,
+               default_images: int) -> List[Dict]:
+    """Turn colors*.md recipes or a JSON preset file into suite jobs.
+
+    Recipes are parsed with the CLI parser itself, so a preset accepts exactly
+    what the equivalent `python generator.py ...` command line would. A recipe
+    is named after the `# ...` comment right above it in its code block or
+    the numbered item introducing the block, else its section heading. A JSON
+    preset file holds a list of {"name", "colors", "num_images", "type"}.
+    Raises ValueError naming the file and line of a recipe the parser rejects.
+    """
+    jobs = []
+    for path in map(Path, paths):
+        if path.suffix == ".json":
+            with open(path) as f:
+                presets = json.load(f)
+            for preset in presets:
+                jobs.append({
+                    'name': preset['name'],
+                    'source': str(path),
+                    'colors': preset.get('colors', []),
+                    'num_images': preset.get('num_images', default_images),
+                    'type': CeramicType(preset['type']) if preset.get('type') else None
+                })
+            continue
+
+        section = label = None
+        in_code = False
+        for line_number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                in_code = not in_code
+                if not in_code:
+                    label = None
+            elif in_code and stripped.startswith("# "):
+                label = stripped[2:].strip()
+            elif stripped.startswith("#") and not stripped.startswith("# "):
+                section, label = stripped.lstrip("#").strip(), None
+            elif not in_code and re.match(r"\d+\.\s", stripped):
+                # "1. Deep Space Theme:" introducing the code block below it
+                label = stripped.split(".", 1)[1].strip().rstrip(":")
+            elif stripped.startswith("python generator.py"):
+                try:
+                    # Presetting num_images keeps argparse from applying its own default
+                    recipe = parser.parse_args(shlex.split(stripped)[2:],
+                                               argparse.Namespace(num_images=default_images))
+                except SystemExit:
+                    raise ValueError(f"{path}:{line_number}: invalid recipe: {stripped}")
+                jobs.append({
+                    'name': label or section,
+                    'source': str(path),
+                    'colors': recipe.colors,
+                    'num_images': recipe.num_images,
+                    'type': CeramicType(recipe.type) if recipe.type else None
+                })
+                label = None
+
+    seen = defaultdict(int)
+    for job in jobs:
+        slug = slugify(job['name'] or Path(job['source']).stem)
+        seen[slug] += 1
+        job['slug'] = slug if seen[slug] == 1 else f"{slug}-{seen[slug]}"
+    return jobs
+
+
+def write_manifest(path: Path, results: List[Dict], **fields) -> Path:
+    manifest = {'created': datetime.now().isoformat(timespec='seconds'), **fields,
+                'results': results}
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def select_keepers(manifest_path: str, filters: List[str] = None,
+                   min_score: float = None) -> List[Dict]:
+    """Turn a draft manifest into a refine plan.
+
+    A draft is kept if its PNG still exists (reviewers delete the rejects),
+    every KEY=VALUE filter matches its manifest entry and, with min_score,
+    its 'score' reaches the threshold. Prompt and seed are carried over so
+    the refined render reproduces the draft at full quality.
+    """
+    with open(manifest_path) as f:
+        drafts = json.load(f)['results']
+
+    conditions = [f.split("=", 1) for f in filters or []]
+    keepers = []
+    for draft in drafts:
+        if not Path(draft['filename']).exists():
+            continue
+        if any(str(draft.get(key)) != value for key, value in conditions):
+            continue
+        if min_score is not None and draft.get('score', float('-inf')) < min_score:
+            continue
+        keepers.append({
+            'ceramic_type': CeramicType(draft['ceramic_type']),
+            'category': draft['category'],
+            'aspect_ratio': AspectRatio.from_name(draft['aspect_ratio']),
+            'prompt': draft['prompt'],
+            'components': draft.get('components', {}),
+            'seed': draft['seed'],
+            'samples': 1
+        })
+    return keepers
+
+
+@contextmanager
+def profile_run(path: str = None, top: int = 20):
+    if not path:
+        yield
+        return
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profiler.write_collapsed(path)
+        print(f"\n{profiler.summary(top)}")
+        print(f"{EMOJIS['save']} Collapsed stacks written to: {path}")
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description='Generate alien ceramic images with specified or automatic colors',
         formatter_class=argparse.RawTextHelpFormatter
@@ -643,8 +3033,160 @@ def main():
                         help='Output directory')
     parser.add_argument('--type', choices=[t.value for t in CeramicType],
                         help='Optional: Specify ceramic type for color selection')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='Requests kept in flight at once')
+    parser.add_argument('--schedule', choices=['sejf', 'fifo'], default='sejf',
+                        help='Dispatch order: shortest expected job first (with aging) or plan order')
+    parser.add_argument('--suite', nargs='+', metavar='PRESETS',
+                        help='Run every recipe in colors*.md files or JSON preset files\n'
+                             'in one process, one output directory per preset')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Presets dispatched concurrently in suite mode')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve Prometheus metrics on this local port while generating')
+    parser.add_argument('--metrics-file',
+                        help='Write Prometheus metrics to this textfile-collector file')
+    parser.add_argument('--host',
+                        help='gRPC host override, e.g. localhost:50051 for fake_stability_server.py')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Write per-stage spans as a Chrome trace-event JSON file')
+    parser.add_argument('--budget-credits', type=float,
+                        help='Stop dispatching before estimated spend exceeds this many credits')
+    parser.add_argument('--budget-minutes', type=float,
+                        help='Stop dispatching new images after this many minutes')
+    parser.add_argument('--rates', metavar='FILE',
+                        help='JSON of per-engine credit rates overriding the assumed defaults,\n'
+                             'e.g. {"stable-diffusion-v1-6": {"credits": 0.25}}')
+    parser.add_argument('--timeout-factor', type=float, metavar='F',
+                        help='Abort requests running longer than F x the learned p95 latency')
+    parser.add_argument('--pacing', type=float, default=0.5, metavar='SECONDS',
+                        help='Pause after each successful request (default: 0.5, 0 disables)')
+    parser.add_argument('--upscale', action='store_true',
+                        help='Chain each final render into the 2x upscaler server-side,\n'
+                             'in the same request (drafts are never upscaled)')
+    parser.add_argument('--local-upscale', type=int, metavar='FACTOR',
+                        help='Lanczos-upscale final renders on local CPUs by FACTOR, written\n'
+                             'next to each original as *_xFACTOR.png')
+    parser.add_argument('--draft', action='store_true',
+                        help='Render quick low-step previews and write OUTPUT_DIR/manifest.json\n'
+                             'for review with --refine')
+    parser.add_argument('--refine', metavar='MANIFEST',
+                        help='Re-render the kept drafts of a --draft manifest at full quality\n'
+                             'with the same prompt and seed (deleted draft PNGs are dropped)')
+    parser.add_argument('--keep', action='append', metavar='KEY=VALUE',
+                        help='Only refine drafts whose manifest entry matches, e.g. category=Cosmic Scale')
+    parser.add_argument('--min-score', type=float,
+                        help="Only refine drafts whose manifest 'score' is at least this")
+    parser.add_argument('--samples', type=int, default=1,
+                        help='Images returned by each request (same prompt, consecutive seeds)')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Flag near-duplicate images (perceptual hashes, needs numpy)\n'
+                             'against this run and every earlier --dedupe run')
+    parser.add_argument('--dedupe-threshold', type=int, default=6, metavar='BITS',
+                        help='Max pHash/dHash Hamming distance counted as a near-duplicate')
+    parser.add_argument('--max-duplicates', type=int, metavar='N',
+                        help='Stop dispatching after N near-duplicates')
+    parser.add_argument('--downweight-duplicates', action='store_true',
+                        help='Halve the sampling weight of prompt components behind each duplicate')
+    parser.add_argument('--verify-colors', action='store_true',
+                        help='Extract dominant colors (k-means, needs numpy) and score each image\n'
+                             'against its requested color')
+    parser.add_argument('--find-color', metavar='COLOR',
+                        help='List verified images whose dominant colors include COLOR\n'
+                             '(e.g. gold; combine with --type) and exit')
+    parser.add_argument('--catalog', default=str(Catalog.DEFAULT_PATH), metavar='DB',
+                        help='SQLite catalog every generated image is recorded in')
+    parser.add_argument('--no-catalog', action='store_true',
+                        help='Do not record this run in the catalog')
+    parser.add_argument('--parquet', metavar='DIR',
+                        help='Also write each run manifest as DIR/<run_id>.parquet (needs pyarrow)')
+
+    queries = parser.add_argument_group(
+        'catalog queries', 'Read the catalog and exit; the --where filters only apply here')
+    queries.add_argument('--search', nargs='?', const='', metavar='TEXT',
+                         help='Full-text search over cataloged prompts, narrowed by --type\n'
+                              'and the --where filters')
+    queries.add_argument('--export-parquet', metavar='DIR',
+                         help='Export every cataloged run (or just --where-run) to DIR as Parquet')
+    queries.add_argument('--where-category', metavar='CATEGORY', help='Classification category')
+    queries.add_argument('--where-aspect', metavar='RATIO', help='Aspect ratio, e.g. 16:9')
+    queries.add_argument('--where-color', metavar='COLOR', help='Requested color')
+    queries.add_argument('--where-seed', type=int, metavar='SEED', help='Seed')
+    queries.add_argument('--where-run', metavar='RUN_ID', help='Run ID')
+    parser.add_argument('--rerolls', type=int, default=2, metavar='N',
+                        help='Retry safety-filtered images with a new seed up to N times')
+    parser.add_argument('--filter-report', action='store_true',
+                        help='Print the prompt components most often caught by the safety filter and exit')
+    parser.add_argument('--estimate', action='store_true',
+                        help='Print the planned batch cost and exit without generating')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Sample the run and write collapsed stacks (flamegraph.pl/speedscope)\n'
+                             'to FILE, then print a per-stage and top-N summary')
+    parser.add_argument('--profile-top', type=int, default=20, metavar='N',
+                        help='Frames listed in the profile summary')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Only show warnings and errors on the console (log file keeps everything)')
+    parser.add_argument('--log-sample', type=int, metavar='N',
+                        help='Only show every Nth info line on the console')
+    return parser
 
+
+def main():
+    parser = build_parser()
     args = parser.parse_args()
+    if args.upscale and args.local_upscale:
+        parser.error("--upscale and --local-upscale are alternatives, pick one")
+    if args.pacing < 0:
+        parser.error("--pacing cannot be negative")
+    filters = [args.where_category, args.where_aspect, args.where_color, args.where_seed]
+    if args.search is None and (any(value is not None for value in filters)
+                                or (args.where_run and not args.export_parquet)):
+        parser.error("--where-* filters only apply to catalog queries, add --search")
+
+    if args.search is not None:
+        catalog = Catalog(args.catalog)
+        try:
+            hits = catalog.search(args.search or None, ceramic_type=args.type,
+                                  category=args.where_category, aspect_ratio=args.where_aspect,
+                                  color=args.where_color, seed=args.where_seed,
+                                  run_id=args.where_run)
+        except sqlite3.OperationalError as e:
+            print(f"{EMOJIS['error']} Invalid search: {str(e)}")
+            return
+        for hit in hits:
+            print(f"{EMOJIS['ceramic']} {hit['run_id']}  {hit['ceramic_type']:<12} "
+                  f"{hit['aspect_ratio']:<5} seed {hit['seed']:<8} {hit['filename']}")
+        print(f"{EMOJIS['info']} {len(hits)} matches")
+        return
+
+    if args.export_parquet:
+        if importlib.util.find_spec("pyarrow") is None:
+            parser.error(
+                "--export-parquet needs pyarrow: pip install -r requirements-analytics.txt")
+        runs = defaultdict(list)
+        for result in Catalog(args.catalog).results(args.where_run):
+            runs[result['run_id']].append(result)
+        for run_id, results in runs.items():
+            manifest_file = write_parquet(results, parquet_path(args.export_parquet, run_id))
+            print(f"{EMOJIS['save']} {len(results)} rows -> {manifest_file}")
+        print(f"{EMOJIS['success']} Exported {len(runs)} runs")
+        return
+
+    if args.find_color:
+        hits = ColorVerifier.load().find(args.find_color, args.type)
+        if not hits:
+            print(f"{EMOJIS['info']} No verified images came out {args.find_color}")
+        for hit in hits:
+            print(f"{EMOJIS['color']} {hit['share']:5.0%} {hit['ceramic_type']:<12} {hit['filename']}")
+        return
+
+    if args.filter_report:
+        worst = FilterStats.load().worst(top=20, min_attempts=1)
+        if not worst:
+            print(f"{EMOJIS['info']} No filtered generations recorded")
+        for component, rate, attempts in worst:
+            print(f"{EMOJIS['warning']} {rate:6.1%} of {attempts:4d}  {component}")
+        return
 
     try:
         env_path = Path('.env')
@@ -655,6 +3197,108 @@ def main():
                 f.write(f"STABILITY_API_KEY={api_key}")
             print(f"{EMOJIS['success']} Created .env file with API key")
 
+        if args.quiet:
+            console_mode = "quiet"
+        elif args.log_sample:
+            console_mode = "sampled"
+        else:
+            console_mode = "all"
+        metrics = GenerationMetrics(textfile=args.metrics_file)
+        tracer = Tracer(args.trace)
+        atexit.register(tracer.export)
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+            print(
+                f"{EMOJIS['info']} Metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+        local_upscaler = LocalUpscaler(args.local_upscale) if args.local_upscale else None
+        if local_upscaler:
+            atexit.register(local_upscaler.shutdown)
+        duplicates = None
+        if args.dedupe or args.max_duplicates or args.downweight_duplicates:
+            if importlib.util.find_spec("numpy") is None:
+                parser.error("--dedupe needs numpy: pip install -r requirements-analytics.txt")
+            duplicates = DuplicateDetector.load(threshold=args.dedupe_threshold)
+        if args.parquet and importlib.util.find_spec("pyarrow") is None:
+            parser.error("--parquet needs pyarrow: pip install -r requirements-analytics.txt")
+        color_verifier = None
+        if args.verify_colors:
+            if importlib.util.find_spec("numpy") is None:
+                parser.error(
+                    "--verify-colors needs numpy: pip install -r requirements-analytics.txt")
+            color_verifier = ColorVerifier.load()
+        cost_model = None
+        if args.rates:
+            try:
+                cost_model = CostModel.load(args.rates)
+            except (OSError, TypeError, ValueError) as e:
+                parser.error(f"--rates {args.rates}: {e}")
+        generator_options = {'console_mode': console_mode,
+                             'log_sample': args.log_sample or 10,
+                             'metrics': metrics,
+                             'tracer': tracer,
+                             'host': args.host,
+                             'budget': Budget(args.budget_credits,
+                                              args.budget_minutes * 60 if args.budget_minutes else None),
+                             'timeout_factor': args.timeout_factor,
+                             'upscale': args.upscale,
+                             'local_upscaler': local_upscaler,
+                             'max_rerolls': args.rerolls,
+                             'samples': args.samples,
+                             'duplicates': duplicates,
+                             'max_duplicates': args.max_duplicates,
+                             'downweight_duplicates': args.downweight_duplicates,
+                             'color_verifier': color_verifier,
+                             'catalog': None if args.no_catalog else Catalog(args.catalog),
+                             'parquet_dir': args.parquet,
+                             'pacing': args.pacing,
+                             'cost_model': cost_model}
+
+        if args.suite:
+            try:
+                jobs = load_suite(args.suite, parser, args.num_images)
+            except ValueError as e:
+                parser.error(str(e))
+            generator = AlienCeramicsGenerator([], **generator_options)
+            estimate = sum(generator.estimate_cost(generator.plan_batch(job['num_images']))
+                           for job in jobs)
+            print(
+                f"{EMOJIS['info']} Estimated cost: {estimate:.2f} credits for {len(jobs)} presets")
+            if args.budget_credits is not None and estimate > args.budget_credits:
+                print(f"{EMOJIS['warning']} Suite exceeds --budget-credits {args.budget_credits:.2f}; "
+                      f"later presets will be trimmed or skipped")
+            if args.estimate:
+                return
+            with profile_run(args.profile, args.profile_top):
+                manifest = generator.run_suite(
+                    jobs, output_dir=args.output_dir, workers=args.workers,
+                    concurrency=args.concurrency, schedule=args.schedule)
+
+            print(f"\n{EMOJIS['info']} Suite Summary:")
+            for preset in manifest['presets']:
+                print(
+                    f"{EMOJIS['batch']} {preset['name']}: {len(preset['results'])} images -> {preset['output_dir']}")
+            print(f"{EMOJIS['success']} Total images: {manifest['total_images']}")
+            return
+
+        if args.refine:
+            plan = select_keepers(args.refine, args.keep, args.min_score)
+            generator = AlienCeramicsGenerator([], **generator_options)
+            plan = generator.trim_to_budget(plan)
+            print(
+                f"{EMOJIS['info']} Refining {len(plan)} kept drafts: "
+                f"{generator.estimate_cost(plan):.2f} credits, "
+                f"{format_duration(generator.estimate_duration(plan, args.concurrency))}")
+            if args.estimate or not plan:
+                return
+            with profile_run(args.profile, args.profile_top):
+                results = generator.generate_batch(
+                    num_images=len(plan), output_dir=args.output_dir, plan=plan,
+                    concurrency=args.concurrency, schedule=args.schedule)
+            manifest_file = write_manifest(Path(args.output_dir) / "manifest.json", results,
+                                           refined_from=args.refine)
+            print(f"{EMOJIS['success']} {len(results)} refined images, manifest: {manifest_file}")
+            return
+
         if not args.colors:
             # Use automatic color selection
             if args.type:
@@ -662,7 +3306,8 @@ def main():
             else:
                 ceramic_type = ColorPalette.get_random_type()
 
-            colors, weights, _ = get_random_colors()
+            colors, weights, _ = get_random_colors(ceramic_type)
+            type_weights = {ceramic_type: 1.0}
             print(f"\n{EMOJIS['info']} Using automatic color selection:")
             print(f"{EMOJIS['ceramic']} Ceramic Type: {ceramic_type.value}")
             print(f"{EMOJIS['color']} Generated color palette:")
@@ -670,13 +3315,43 @@ def main():
                 print(f"  - {color} (weight: {weight*100:.1f}%)")
         else:
             colors = args.colors
-
-        generator = AlienCeramicsGenerator(colors)
-
-        results = generator.generate_batch(
-            num_images=args.num_images,
-            output_dir=args.output_dir
-        )
+            color_index = ColorIndex.build()
+            for color in colors:
+                resolved = color_index.resolve(color)
+                if resolved['suggestions']:
+                    hints = ", ".join(name for name, _ in resolved['suggestions'])
+                    print(
+                        f"{EMOJIS['warning']} Unknown color '{color}', did you mean: {hints}?")
+            # Palettes drawn from a known family steer the plan towards that type
+            type_weights = color_index.infer_type_weights(colors) or None
+
+        generator = AlienCeramicsGenerator(colors, **generator_options)
+
+        plan = generator.trim_to_budget(
+            generator.plan_batch(args.num_images, type_weights=type_weights), args.draft)
+        print(
+            f"{EMOJIS['info']} Estimated cost: {generator.estimate_cost(plan, args.draft):.2f} credits "
+            f"for {len(plan) * generator.samples} images ({generator.engine}, {generator.request_steps(args.draft)} steps)")
+        print(
+            f"{EMOJIS['time']} Estimated duration: "
+            f"{format_duration(generator.estimate_duration(plan, args.concurrency, args.draft))}")
+        if args.estimate:
+            return
+        with profile_run(args.profile, args.profile_top):
+            results = generator.generate_batch(
+                num_images=args.num_images,
+                output_dir=args.output_dir,
+                plan=plan,
+                concurrency=args.concurrency,
+                schedule=args.schedule,
+                draft=args.draft
+            )
+        if args.draft:
+            manifest_file = write_manifest(Path(args.output_dir) / "manifest.json", results,
+                                           draft_steps=generator.draft_steps)
+            print(f"\n{EMOJIS['save']} Draft manifest: {manifest_file}")
+            print(f"{EMOJIS['info']} Delete the rejects, then: "
+                  f"python generator.py --refine {manifest_file} -o <dir>")
 
         print(f"\n{EMOJIS['info']} Generation Summary:")
         for result in results:
@@ -686,8 +3361,11 @@ def main():
             print(f"{EMOJIS['prompt']} Prompt: {result['prompt']}")
             print(
                 f"{EMOJIS['time']} Generation Time: {result['generation_time']}")
-            if result['seed']:
+            if result['seed'] is not None:
                 print(f"{EMOJIS['info']} Seed: {result['seed']}")
+            if result.get('upscaled_filename'):
+                print(f"{EMOJIS['dim']} Upscaled: {result['upscaled_filename']} "
+                      f"({result['upscaled_dimensions']})")
 
     except ValueError as e:
         print(f"{EMOJIS['error']} Configuration error: {str(e)}")
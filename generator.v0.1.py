@@ -13,6 +13,7 @@ import argparse
 from collections import defaultdict
 import logging
 from datetime import datetime
+from generator import EngineCapabilities
 
 # Emoji constants for logging
 EMOJIS = {
@@ -91,6 +92,12 @@ class ColorManager:
         self.used_colors: Set[str] = set()
         self.color_usage = defaultdict(int)
 
+        # Shuffled deck dealt without replacement, reshuffled once exhausted
+        self.deck = list(requested_colors)
+        random.shuffle(self.deck)
+        self.deck_position = 0
+        self.distinct_colors = len(set(requested_colors))
+
         # Base colors that will always be available
         self.base_colors = [
             "iridescent",
@@ -101,20 +108,19 @@ class ColorManager:
         ]
 
     def get_next_color(self) -> str:
-        unused_colors = [
-            c for c in self.requested_colors if c not in self.used_colors]
+        if self.deck_position >= len(self.deck):
+            random.shuffle(self.deck)
+            self.deck_position = 0
 
-        if unused_colors:
-            chosen_color = random.choice(unused_colors)
-        else:
-            chosen_color = random.choice(self.requested_colors)
+        chosen_color = self.deck[self.deck_position]
+        self.deck_position += 1
 
         self.used_colors.add(chosen_color)
         self.color_usage[chosen_color] += 1
         return chosen_color
 
     def all_colors_used(self) -> bool:
-        return all(color in self.used_colors for color in self.requested_colors)
+        return len(self.used_colors) == self.distinct_colors
 
     def get_usage_summary(self) -> Dict[str, int]:
         return dict(self.color_usage)
@@ -141,11 +147,15 @@ class AlienCeramicsGenerator:
             raise ValueError(
                 "API key format appears invalid. Please check your API key.")
 
+        self.engine = "stable-diffusion-xl-1024-v1-0"
+        # Sizes are snapped to what the engine accepts before each request
+        self.capabilities = EngineCapabilities(self.engine)
+
         try:
             self.stability_api = client.StabilityInference(
                 key=self.api_key,
                 verbose=True,
-                engine="stable-diffusion-xl-1024-v1-0",
+                engine=self.engine,
             )
             self._test_connection()
             self.logger.info(
@@ -587,6 +597,7 @@ class AlienCeramicsGenerator:
             aspect_ratio = self.get_random_aspect_ratio()
             prompt = self.generate_prompt(aspect_ratio)
             current_seed = seed if seed else random.randint(0, 1000000)
+            width, height = self.capabilities.snap(aspect_ratio.width, aspect_ratio.height)
 
             try:
                 self.logger.info(
@@ -594,7 +605,7 @@ class AlienCeramicsGenerator:
                 self.logger.info(
                     f"{EMOJIS['aspect']} Aspect Ratio: {aspect_ratio.ratio_name}")
                 self.logger.info(
-                    f"{EMOJIS['dim']} Dimensions: {aspect_ratio.width}x{aspect_ratio.height}")
+                    f"{EMOJIS['dim']} Dimensions: {width}x{height}")
                 self.logger.info(f"{EMOJIS['prompt']} Prompt: {prompt}")
 
                 generation_start = time.time()
@@ -614,10 +625,8 @@ class AlienCeramicsGenerator:
                     seed=current_seed,
                     steps=50,  # Increased steps for better quality
                     cfg_scale=7.5,
-                    # Ensure width doesn't exceed 512
-                    width=min(aspect_ratio.width, 512),
-                    # Ensure height doesn't exceed 512
-                    height=min(aspect_ratio.height, 512),
+                    width=width,
+                    height=height,
                     samples=1,
                     sampler=generation.SAMPLER_K_DPMPP_2M
                 )
@@ -634,7 +643,7 @@ class AlienCeramicsGenerator:
                         'filename': str(filename),
                         'prompt': prompt,
                         'aspect_ratio': aspect_ratio.ratio_name,
-                        'dimensions': f"{aspect_ratio.width}x{aspect_ratio.height}",
+                        'dimensions': f"{width}x{height}",
                         'seed': current_seed,
                         'generation_time': f"{generation_time:.2f}s",
                     })
@@ -0,0 +1,157 @@
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from generator import (EMOJIS, AlienCeramicsGenerator, AspectRatio, CeramicType,
+                       ColorPalette, get_random_colors)
+
+
+def load_v0_1():
+    # The versioned scripts aren't importable by name because of the dots
+    path = Path(__file__).parent / "generator.v0.1.py"
+    spec = importlib.util.spec_from_file_location("generator_v0_1", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_per_op(fn: Callable, warmup: float, target: float, repeats: int) -> Dict:
+    """Median ns/op over `repeats` timed loops, each sized to run ~`target` seconds."""
+    deadline = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        fn()
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= target / 10:
+            break
+        loops *= 2
+    loops = max(1, int(loops * target / max(time.perf_counter() - start, 1e-9) / 10))
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter_ns()
+            for _ in range(loops):
+                fn()
+            samples.append((time.perf_counter_ns() - start) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    median = statistics.median(samples)
+    mad = statistics.median(abs(s - median) for s in samples)
+    return {'ns_per_op': median, 'mad_ns': mad, 'min_ns': min(samples), 'loops': loops}
+
+
+def allocations_per_op(fn: Callable, calls: int = 50, overhead: Dict = None) -> Dict:
+    """Peak traced bytes and retained blocks of a single call (median over `calls`),
+    minus the snapshot overhead measured on a no-op."""
+    if overhead is None:
+        overhead = allocations_per_op(lambda: None, calls,
+                                      {'peak_bytes_per_op': 0, 'retained_blocks_per_op': 0})
+    peaks, blocks = [], []
+    for _ in range(calls):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        blocks.append(sum(max(0, stat.count_diff) for stat in stats))
+        peaks.append(peak)
+    return {
+        'peak_bytes_per_op': max(0, statistics.median(peaks) - overhead['peak_bytes_per_op']),
+        'retained_blocks_per_op': max(0, statistics.median(blocks) - overhead['retained_blocks_per_op'])
+    }
+
+
+def build_cases() -> Dict[str, Callable]:
+    os.environ.setdefault("STABILITY_API_KEY", "microbenchmark")
+    # Channels connect lazily, so no request ever leaves the process
+    generator = AlienCeramicsGenerator([], console_mode="quiet", host="localhost:1")
+    v0_1 = load_v0_1()
+    color_manager = v0_1.ColorManager([f"color {n}" for n in range(64)])
+
+    return {
+        'generate_prompt': lambda: generator.generate_prompt(AspectRatio.LANDSCAPE_16_9),
+        'get_harmonic_colors[1]': lambda: ColorPalette.get_harmonic_colors(CeramicType.STELLAR, 1),
+        'get_harmonic_colors[4]': lambda: ColorPalette.get_harmonic_colors(CeramicType.STELLAR, 4),
+        'get_random_colors': get_random_colors,
+        'v0.1 ColorManager.get_next_color': color_manager.get_next_color,
+        'AspectRatio[name]': lambda: AspectRatio['PORTRAIT_9_16'],
+        'AspectRatio(value)': lambda: AspectRatio(("9:16", 468, 832)),
+        'list(AspectRatio)': lambda: list(AspectRatio),
+        'AspectRatio.width': lambda: AspectRatio.SQUARE_1_1.width
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Microbenchmarks for prompt and palette hot paths',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-k', '--filter', default='',
+                        help='Only run cases whose name contains this text')
+    parser.add_argument('--warmup', type=float, default=0.2,
+                        help='Seconds of warm-up per case')
+    parser.add_argument('--target', type=float, default=0.1,
+                        help='Approximate seconds per timed repeat')
+    parser.add_argument('--repeats', type=int, default=15,
+                        help='Timed repeats per case; the median is reported')
+    parser.add_argument('-o', '--output',
+                        help='Write results as JSON to track them over time')
+    parser.add_argument('--baseline',
+                        help='Previous JSON results to show ns/op changes against')
+
+    args = parser.parse_args()
+
+    baseline = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+
+    results: List[Dict] = []
+    for name, fn in build_cases().items():
+        if args.filter not in name:
+            continue
+        case = {'name': name,
+                **time_per_op(fn, args.warmup, args.target, args.repeats),
+                **allocations_per_op(fn)}
+        results.append(case)
+
+        line = (f"{EMOJIS['time']} {name:<36} {case['ns_per_op']:>10.0f} ns/op "
+                f"± {case['mad_ns']:<7.0f} {case['peak_bytes_per_op']:>8.0f} B peak "
+                f"{case['retained_blocks_per_op']:>4.0f} blocks")
+        previous = next((c for c in baseline if c['name'] == name), None)
+        if previous:
+            line += f"  ({(case['ns_per_op'] / previous['ns_per_op'] - 1):+.1%} vs baseline)"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'cases': results
+            }, f, indent=2)
+        print(f"{EMOJIS['save']} Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
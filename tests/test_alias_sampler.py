@@ -0,0 +1,46 @@
+import random
+from collections import Counter
+
+import pytest
+
+from generator import AliasSampler, ColorPalette, ColorTable
+
+
+def test_empirical_frequencies_track_weights():
+    weights = [5, 1, 0, 3, 1]
+    sampler = AliasSampler(weights)
+    rng = random.Random(7)
+    draws = 200_000
+    counts = Counter(sampler.draw(rng) for _ in range(draws))
+    assert counts[2] == 0
+    for index, weight in enumerate(weights):
+        assert counts[index] / draws == pytest.approx(weight / sum(weights), abs=0.01)
+
+
+def test_empty_weights_are_rejected():
+    with pytest.raises(ValueError):
+        AliasSampler([])
+
+
+def test_draws_without_replacement_never_repeat():
+    table = ColorTable({"primary": ["a", "b", "c"], "energy": ["d", "e"], "phase": ["f"]})
+    rng = random.Random(3)
+    for num_colors in range(1, 7):
+        for _ in range(200):
+            picked = table.draw(num_colors, rng)
+            assert len(picked) == len(set(picked)) == num_colors
+
+
+@pytest.mark.parametrize("num_colors", range(1, 8))
+def test_color_weights_match_the_count(num_colors):
+    weights = ColorPalette.get_color_weights(num_colors)
+    assert len(weights) == num_colors
+    assert sum(weights) == pytest.approx(1.0)
+    assert weights == sorted(weights, reverse=True)
+
+
+def test_family_with_five_categories_draws_all():
+    table = ColorTable({name: [f"{name} blue"] for name in ("a", "b", "c", "d", "e")})
+    assert len(table.draw(5)) == 5
+    with pytest.raises(ValueError):
+        ColorPalette.get_color_weights(0)
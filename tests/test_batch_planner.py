@@ -0,0 +1,37 @@
+from collections import Counter
+
+import pytest
+
+from generator import AspectRatio, BatchPlanner, CeramicType
+
+CATEGORIES = [f"category {n}" for n in range(9)]
+
+
+@pytest.mark.parametrize("num_images", [5, 7, 9, 12, 40])
+def test_small_batches_cover_every_marginal(num_images):
+    for _ in range(50):
+        plan = BatchPlanner(CATEGORIES).plan(num_images)
+        assert len(plan) == num_images
+        types = Counter(item['ceramic_type'] for item in plan)
+        categories = Counter(item['category'] for item in plan)
+        aspects = Counter(item['aspect_ratio'] for item in plan)
+        assert len(types) == min(num_images, len(CeramicType))
+        assert len(categories) == min(num_images, len(CATEGORIES))
+        assert len(aspects) == min(num_images, len(AspectRatio))
+        # Largest remainder: no value more than one image off its share
+        for counts, size in ((types, len(CeramicType)), (categories, len(CATEGORIES)),
+                             (aspects, len(AspectRatio))):
+            assert max(counts.values()) - min(counts.values()) <= 1 or len(counts) < size
+
+
+def test_type_aspect_pairs_covered_in_minimum_images():
+    num_images = len(CeramicType) * len(AspectRatio)
+    plan = BatchPlanner(CATEGORIES).plan(num_images)
+    pairs = {(item['ceramic_type'], item['aspect_ratio']) for item in plan}
+    assert len(pairs) == num_images
+
+
+def test_weighted_marginals_follow_targets():
+    planner = BatchPlanner(CATEGORIES, type_weights={CeramicType.STELLAR: 3, CeramicType.QUANTUM: 1})
+    types = Counter(item['ceramic_type'] for item in planner.plan(8))
+    assert types == {CeramicType.STELLAR: 6, CeramicType.QUANTUM: 2}
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from generator import AlienCeramicsGenerator, AspectRatio, Budget, CostModel
+
+
+def test_reservations_stop_at_the_credit_limit():
+    budget = Budget(credits=1.0)
+    assert budget.try_reserve(0.6)
+    assert not budget.try_reserve(0.6)
+    assert budget.available() == pytest.approx(0.4)
+    budget.refund(0.6)
+    assert budget.available() == pytest.approx(1.0)
+    assert budget.try_reserve(0.6)
+
+
+def test_unlimited_budget_has_nothing_available_to_report():
+    budget = Budget()
+    assert budget.available() is None
+    assert budget.try_reserve(1e9, seconds=1e9)
+
+
+def test_requests_ending_after_the_deadline_are_refused():
+    budget = Budget(seconds=60)
+    assert budget.try_reserve(0.0, seconds=30)
+    assert not budget.try_reserve(0.0, seconds=90)
+    budget.deadline = time.time() - 1
+    assert not budget.try_reserve(0.0)
+
+
+def test_rate_overrides_merge_into_the_defaults(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text('{"stable-diffusion-v1-6": {"credits": 0.4}}')
+    costs = CostModel.load(path)
+    assert costs.estimate("stable-diffusion-v1-6", 512, 512, 30) == pytest.approx(0.4)
+    assert costs.estimate("stable-diffusion-v1-6", 1024, 512, 15) == pytest.approx(0.4)
+    # Untouched engines and the class defaults keep the assumed rates
+    assert costs.estimate("stable-diffusion-xl-1024-v1-0", 1024, 1024, 50) == pytest.approx(0.6)
+    assert CostModel().estimate("stable-diffusion-v1-6", 512, 512, 30) == pytest.approx(0.2)
+
+
+def test_new_engine_rates_need_every_field():
+    with pytest.raises(ValueError, match="missing steps, pixels, flat_resolution"):
+        CostModel({"new-engine": {"credits": 1.0}})
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STABILITY_API_KEY", "test")
+
+    def build(**options):
+        # Runs in tmp_path, so any model the generator persists stays there
+        return AlienCeramicsGenerator([], console_mode="quiet", host="localhost:1", **options)
+    return build
+
+
+def test_trim_to_budget_keeps_the_affordable_prefix(generator):
+    plan = [{'aspect_ratio': AspectRatio.SQUARE_1_1}] * 10
+    trimmed = generator(budget=Budget(credits=2.0)).trim_to_budget(plan)
+    # SDXL bills 0.6 credits per image at any size
+    assert trimmed == plan[:3]
+    assert generator(budget=Budget(credits=6.0)).trim_to_budget(plan) == plan
+    assert generator().trim_to_budget(plan) == plan
+
+
+def test_trim_to_budget_uses_overridden_rates(generator):
+    plan = [{'aspect_ratio': AspectRatio.SQUARE_1_1}] * 10
+    cost_model = CostModel({"stable-diffusion-xl-1024-v1-0": {"credits": 1.0}})
+    assert len(generator(budget=Budget(credits=2.0), cost_model=cost_model).trim_to_budget(plan)) == 2
@@ -0,0 +1,25 @@
+import pytest
+
+from generator import Catalog
+
+
+def result(run_id, prompt, seed):
+    return {'run_id': run_id, 'filename': "out/ceramic_0_1_1_0.png", 'prompt': prompt, 'seed': seed,
+            'ceramic_type': "stellar", 'aspect_ratio': "1:1",
+            'components': {'color': "predominantly nova white"}}
+
+
+def test_rerecorded_artifact_replaces_its_search_entry(tmp_path):
+    catalog = Catalog(tmp_path / "catalog.db")
+    if not catalog.fts:
+        pytest.skip("SQLite built without FTS5")
+    catalog.record_run("run1", [result("run1", "quantum vessel", 1)])
+    catalog.record_run("run2", [result("run2", "temporal urn", 2)])
+
+    stale = catalog.connection.execute(
+        "SELECT rowid FROM artifacts_fts WHERE artifacts_fts MATCH 'quantum'").fetchall()
+    assert stale == []
+    hits = catalog.search("temporal")
+    assert [(hit['run_id'], hit['seed']) for hit in hits] == [("run2", 2)]
+    assert catalog.search(color="nova white")[0]['seed'] == 2
+    catalog.close()
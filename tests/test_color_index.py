@@ -0,0 +1,38 @@
+from generator import COLOR_GUIDES, CeramicType, ColorIndex, load_color_guide
+
+
+def test_typo_ranks_its_palette_color_first():
+    index = ColorIndex.build(guides=[])
+    resolved = index.resolve("nebual purple")
+    assert resolved['matches'] == []
+    assert resolved['suggestions'][0][0] == "nebula purple"
+
+
+def test_exact_lookup_is_case_and_space_insensitive():
+    index = ColorIndex.build(guides=[])
+    entries = index.lookup("  Nebula   PURPLE ")
+    assert [entry['ceramic_type'] for entry in entries] == [CeramicType.STELLAR]
+    assert index.infer_type_weights(["nebula purple"]) == {CeramicType.STELLAR: 1.0}
+
+
+def test_guide_parsing_reads_bullets_and_recipes(tmp_path):
+    guide = tmp_path / "colors.md"
+    guide.write_text(
+        "## Cosmic Palettes\n"
+        "- `starlight silver` for highlights\n"
+        "```\n"
+        "# Cosmic Theme\n"
+        'python generator.py "deep space blue" "comet white" -n 5\n'
+        "```\n", encoding="utf-8")
+    assert load_color_guide(guide) == [
+        ("starlight silver", "Cosmic Palettes"),
+        ("deep space blue", "Cosmic Palettes"),
+        ("comet white", "Cosmic Palettes"),
+    ]
+    index = ColorIndex.build(guides=[guide])
+    assert index.lookup("comet white")[0]['category'] == "Cosmic Palettes"
+
+
+def test_shipped_guides_parse():
+    for guide in COLOR_GUIDES:
+        assert load_color_guide(guide)
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from generator import DispatchScheduler, LatencyEstimator
+
+
+def test_cold_model_ranks_by_size_and_steps(tmp_path):
+    latency = LatencyEstimator(tmp_path / "latency.json")
+    small = latency.predict(LatencyEstimator.key("engine", 512, 512, 30, 9))
+    large = latency.predict(LatencyEstimator.key("engine", 1024, 1024, 50, 9))
+    batch = latency.predict(LatencyEstimator.key("engine*2", 1024, 1024, 50, 9))
+    assert small < large == LatencyEstimator.PRIOR_SECONDS < batch
+
+
+def test_sejf_pops_shortest_first():
+    scheduler = DispatchScheduler("sejf")
+    for name, predicted in (("slow", 9.0), ("fast", 1.0), ("medium", 4.0)):
+        scheduler.push(name, predicted)
+    assert [scheduler.pop() for _ in range(3)] == ["fast", "medium", "slow"]
+
+
+def test_requeued_entry_ages_behind_waiting_work():
+    scheduler = DispatchScheduler("sejf", aging=1.0)
+    scheduler.push("planned", 2.0)
+    time.sleep(0.05)
+    scheduler.push("reroll", 1.99)
+    assert scheduler.pop() == "planned"
+
+
+def test_pop_waits_for_running_entries_to_requeue():
+    scheduler = DispatchScheduler("fifo")
+    scheduler.push("first", 1.0)
+    assert scheduler.pop() == "first"
+    popped = []
+    waiter = threading.Thread(target=lambda: popped.append(scheduler.pop()))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+    scheduler.push("reroll", 1.0)
+    scheduler.done()
+    waiter.join(1)
+    assert popped == ["reroll"]
+    scheduler.done()
+    assert scheduler.pop() is None
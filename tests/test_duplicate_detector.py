@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from generator import DuplicateDetector, ImageAnalyzer
+
+
+def test_drain_waits_for_duplicate_callbacks(tmp_path):
+    paths = []
+    for n in range(3):
+        path = tmp_path / f"image_{n}.png"
+        Image.new("RGB", (32, 32), (30, 80, 200)).save(path)
+        paths.append(path)
+    detector = DuplicateDetector(tmp_path / "phash_index.json")
+    seen = []
+
+    def slow_duplicate(result, match):
+        time.sleep(0.2)
+        seen.append(result['filename'])
+
+    detector.on_duplicate = slow_duplicate
+    analyzer = ImageAnalyzer([detector], workers=1)
+    results = [{'filename': str(path)} for path in paths]
+    try:
+        for result in results:
+            analyzer.submit(result)
+        analyzer.drain()
+        # The first image is the original, every later one duplicates it
+        assert sorted(seen) == [str(path) for path in paths[1:]]
+        assert all(result.get('near_duplicate_of') for result in results[1:])
+        assert len(DuplicateDetector.load(tmp_path / "phash_index.json").entries) == 3
+    finally:
+        analyzer.shutdown()
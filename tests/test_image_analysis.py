@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from generator import ColorPalette, ColorVerifier
+
+
+def test_modifiers_give_palette_names_their_own_lab(tmp_path):
+    verifier = ColorVerifier(tmp_path / "colors.json")
+    void, plasma = verifier.lab_for("void blue"), verifier.lab_for("plasma blue")
+    assert void[0] < verifier.base_lab["blue"][0] < plasma[0]
+    names = {name for groups in ColorPalette.COLOR_FAMILIES.values()
+             for colors in groups.values() for name in colors}
+    targets = {tuple(round(v, 3) for v in verifier.lab_for(name)) for name in names}
+    assert len(targets) > len(ColorVerifier.BASE_COLORS)
+
+
+def test_unknown_requested_colors_are_counted(tmp_path):
+    verifier = ColorVerifier(tmp_path / "colors.json")
+    clusters = [{'lab': [50.0, 0.0, 0.0], 'share': 1.0}]
+    result = {'filename': "a.png", 'components': {'color': "predominantly chartreuse"}}
+    verifier.process(result, clusters)
+    assert 'color_adherence' not in result
+    assert verifier.take_unscored() == {"chartreuse": 1}
+    assert verifier.take_unscored() == {}
@@ -0,0 +1,49 @@
+import pytest
+
+from generator import LatencyEstimator
+
+KEY = LatencyEstimator.key("engine", 1024, 1024, 50, 9)
+
+
+def test_first_observation_seeds_every_statistic(tmp_path):
+    latency = LatencyEstimator(tmp_path / "latency.json")
+    latency.observe(KEY, 8.0)
+    assert {stat: latency.predict(KEY, stat) for stat in ("mean", "p50", "p95")} == \
+        {"mean": 8.0, "p50": 8.0, "p95": 8.0}
+
+
+def test_ewma_and_quantiles_track_observations(tmp_path):
+    latency = LatencyEstimator(tmp_path / "latency.json", alpha=0.5)
+    latency.observe(KEY, 8.0)
+    latency.observe(KEY, 12.0)
+    # Mean moves alpha of the way towards the new sample
+    assert latency.predict(KEY) == pytest.approx(10.0)
+    for _ in range(500):
+        for seconds in (4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0, 30.0):
+            latency.observe(KEY, seconds)
+    assert 6.0 < latency.predict(KEY, "p50") < 11.0
+    assert latency.predict(KEY, "p50") < latency.predict(KEY, "p95")
+    assert latency.predict(KEY, "p95") > 12.0
+
+
+def test_model_round_trips_through_json(tmp_path):
+    path = tmp_path / "models" / "latency.json"
+    latency = LatencyEstimator(path)
+    for seconds in (8.0, 9.0, 14.0):
+        latency.observe(KEY, seconds)
+    latency.save()
+    loaded = LatencyEstimator.load(path)
+    assert loaded.stats == latency.stats
+    assert LatencyEstimator.load(tmp_path / "missing.json").stats == {}
+
+
+def test_unseen_size_scales_the_closest_known_size(tmp_path):
+    latency = LatencyEstimator(tmp_path / "latency.json")
+    latency.observe(LatencyEstimator.key("engine", 512, 512, 50, 9), 2.0)
+    latency.observe(KEY, 8.0)
+    latency.observe(LatencyEstimator.key("other", 640, 640, 50, 9), 100.0)
+    # 640x640 is closer to 512x512 than to 1024x1024; half the steps, half the time
+    unseen = LatencyEstimator.key("engine", 640, 640, 25, 9)
+    assert latency.predict(unseen) == pytest.approx(2.0 * (640 * 640) / (512 * 512) / 2)
+    assert latency.predict(LatencyEstimator.key("engine", 1024, 896, 50, 9)) == \
+        pytest.approx(8.0 * 896 / 1024)
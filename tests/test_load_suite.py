@@ -0,0 +1,41 @@
+import pytest
+
+from generator import CeramicType, build_parser, load_suite
+
+
+def write(tmp_path, text):
+    path = tmp_path / "colors.md"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_presets_are_named_after_their_labels(tmp_path):
+    guide = write(tmp_path, (
+        "### Basic Color Combinations\n"
+        "```bash\n"
+        "# Cosmic Theme\n"
+        'python generator.py "nebula purple" "aurora green"\n'
+        "\n"
+        "# Crystal Theme\n"
+        'python generator.py "clear quartz" -n 2 --type stellar\n'
+        "```\n"
+        "1. Deep Space Theme:\n"
+        "```bash\n"
+        'python generator.py "void black"\n'
+        "```\n"
+        "### Unlabeled\n"
+        "```bash\n"
+        'python generator.py "void black"\n'
+        "```\n"))
+    jobs = load_suite([guide], build_parser(), 3)
+    assert [job['slug'] for job in jobs] == [
+        "cosmic-theme", "crystal-theme", "deep-space-theme", "unlabeled"]
+    assert jobs[0]['colors'] == ["nebula purple", "aurora green"]
+    assert (jobs[1]['num_images'], jobs[1]['type']) == (2, CeramicType.STELLAR)
+    assert jobs[0]['num_images'] == 3
+
+
+def test_invalid_recipe_reports_file_and_line(tmp_path):
+    guide = write(tmp_path, "```\n# Broken\npython generator.py red -n many\n```\n")
+    with pytest.raises(ValueError, match=r"colors\.md:3: invalid recipe"):
+        load_suite([guide], build_parser(), 3)
@@ -0,0 +1,47 @@
+import json
+
+from generator import AspectRatio, CeramicType, select_keepers
+
+
+def write_manifest(tmp_path, drafts):
+    for draft in drafts:
+        if draft.pop('exists', True):
+            (tmp_path / draft['filename']).write_bytes(b"png")
+        draft['filename'] = str(tmp_path / draft['filename'])
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({'results': drafts}))
+    return path
+
+
+def draft(filename, **fields):
+    return {'filename': filename, 'ceramic_type': CeramicType.STELLAR.value,
+            'category': "vessel", 'aspect_ratio': "1:1", 'prompt': f"prompt {filename}",
+            'components': {'base': "vessel"}, 'seed': 42, **fields}
+
+
+def test_deleted_drafts_and_filter_mismatches_are_dropped(tmp_path):
+    path = write_manifest(tmp_path, [
+        draft("kept.png", seed=0),
+        draft("deleted.png", exists=False),
+        draft("landscape.png", aspect_ratio="16:9"),
+    ])
+    keepers = select_keepers(path, filters=["aspect_ratio=1:1"])
+    assert [k['prompt'] for k in keepers] == ["prompt kept.png"]
+    keeper = keepers[0]
+    assert keeper['ceramic_type'] is CeramicType.STELLAR
+    assert keeper['aspect_ratio'] is AspectRatio.SQUARE_1_1
+    # Seed 0 is carried over, not replaced by a random one
+    assert keeper['seed'] == 0
+    assert keeper['samples'] == 1
+
+
+def test_min_score_keeps_drafts_at_or_above_the_threshold(tmp_path):
+    path = write_manifest(tmp_path, [
+        draft("high.png", score=0.9),
+        draft("edge.png", score=0.5),
+        draft("low.png", score=0.1),
+        draft("unscored.png"),
+    ])
+    assert [k['prompt'] for k in select_keepers(path, min_score=0.5)] == \
+        ["prompt high.png", "prompt edge.png"]
+    assert len(select_keepers(path)) == 4